@@ -0,0 +1,159 @@
+"""
+Static asset pipeline.
+
+Build the assets once per release, before starting the app:
+
+    python assets.py
+
+Every file of `static/` is copied to `static_build/` under its own name and under a
+content-hashed name (`styles.<hash>.css`), with gzip and, when the `brotli` package
+is installed, brotli variants next to them. `manifest.json` maps each name to its
+hashed name. When `static_build/` exists the app serves it instead of `static/`.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from functools import lru_cache
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+SOURCE_DIR = "static"
+BUILD_DIR = "static_build"
+MANIFEST = "manifest.json"
+
+# Files worth compressing; images and fonts are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# (Accept-Encoding token, file suffix) of the variants, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants[".br"] = brotli.compress(data, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+def build(source=SOURCE_DIR, target=BUILD_DIR):
+    """
+    Build ``target`` from the assets of ``source``.
+
+    Returns:
+        dict: The manifest, mapping each asset path to its hashed path.
+    """
+    shutil.rmtree(target, ignore_errors=True)
+    manifest = {}
+    for directory, _, files in os.walk(source):
+        for name in files:
+            path = os.path.relpath(os.path.join(directory, name), source).replace(os.sep, "/")
+            with open(os.path.join(source, path), "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            stem, extension = os.path.splitext(path)
+            manifest[path] = f"{stem}.{digest}{extension}"
+            media_type = mimetypes.guess_type(name)[0] or ""
+            for built in (path, manifest[path]):
+                built_path = os.path.join(target, built)
+                os.makedirs(os.path.dirname(built_path), exist_ok=True)
+                shutil.copyfile(os.path.join(source, path), built_path)
+                if media_type.startswith(COMPRESSIBLE_TYPES):
+                    _compress(built_path)
+    with open(os.path.join(target, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def static_directory():
+    """ The built assets if `python assets.py` was run, else the sources. """
+    return BUILD_DIR if os.path.isfile(os.path.join(BUILD_DIR, MANIFEST)) else SOURCE_DIR
+
+
+@lru_cache
+def load_manifest():
+    path = os.path.join(static_directory(), MANIFEST)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def asset(path):
+    """ Path of an asset to pass to url_for('static', ...): its content-hashed name once built. """
+    return load_manifest().get(path.lstrip("/"), path)
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles serving precompressed variants and long-lived caching headers.
+
+    A ``.br`` or ``.gz`` file next to the requested one is sent instead when the
+    client accepts that encoding. Content-hashed assets (listed in the manifest)
+    never change, so they are sent with an immutable Cache-Control; other files must
+    be revalidated with their ETag. The variants available are listed and stat'ed once,
+    when the app starts, so a request costs no extra filesystem lookup.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hashed = set()
+        self.variants = {}
+        if self.directory is None:
+            return
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                self.hashed = set(json.load(f).values())
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                for encoding, suffix in ENCODINGS:
+                    if name.endswith(suffix):
+                        path = os.path.relpath(os.path.join(directory, name[:-len(suffix)]), self.directory)
+                        stat_result = os.stat(os.path.join(directory, name))
+                        self.variants.setdefault(path.replace(os.sep, "/"), {})[encoding] = stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        available = self.variants.get(path)
+        encoding = None
+        if available:
+            accepted = {token.split(";")[0].strip() for token in request_headers.get("accept-encoding", "").split(",")}
+            encoding = next((name for name, _ in ENCODINGS if name in available and name in accepted), None)
+
+        if encoding is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        else:
+            suffix = dict(ENCODINGS)[encoding]
+            response = FileResponse(
+                f"{full_path}{suffix}", status_code=status_code, media_type=mimetypes.guess_type(path)[0],
+                stat_result=available[encoding],
+            )
+            response.headers["content-encoding"] = encoding
+        if available:
+            response.headers["vary"] = "Accept-Encoding"
+        if path in self.hashed:
+            response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["cache-control"] = "no-cache"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == '__main__':
+    for path, hashed in build().items():
+        print(f"{path} -> {BUILD_DIR}/{hashed}")
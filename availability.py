@@ -0,0 +1,119 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+
+
+def parse_datetime(value):
+    """
+    Convert a stored ISO-8601 string or a datetime to a UTC datetime, so naive and
+    aware values compare; naive ones are taken as UTC, as on the SQL backend.
+    Much cheaper than validating a whole Pydantic model just to compare dates.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class IntervalIndex:
+    """
+    Per-key index of half-open [start, end) intervals answering overlap queries.
+
+    Intervals of each key (e.g. a room id) are kept sorted by start. Every interval
+    overlapping [start, end) must begin after ``start - longest`` and before ``end``,
+    where ``longest`` is the longest interval currently indexed for that key, so a
+    query is two bisections plus a scan over that window: O(log n + k). The lengths
+    are kept sorted too, so removing the longest interval narrows the window again.
+
+    Attributes:
+        starts (dict): Sorted interval starts per key.
+        entries (dict): (start, end, pk) tuples per key, aligned with ``starts``.
+        lengths (dict): Sorted interval lengths per key.
+    """
+
+    def __init__(self):
+        self.starts = {}
+        self.entries = {}
+        self.lengths = {}
+
+    def add(self, key, start, end, pk):
+        """ Index the interval [start, end) of record ``pk`` under ``key``. """
+        starts = self.starts.setdefault(key, [])
+        entries = self.entries.setdefault(key, [])
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        entries.insert(position, (start, end, pk))
+        insort(self.lengths.setdefault(key, []), end - start)
+
+    def remove(self, key, start, pk):
+        """ Drop the interval of record ``pk`` starting at ``start`` under ``key``. """
+        starts = self.starts.get(key, [])
+        entries = self.entries.get(key, [])
+        position = bisect_left(starts, start)
+        while position < len(starts) and starts[position] == start:
+            if entries[position][2] == pk:
+                lengths = self.lengths[key]
+                del lengths[bisect_left(lengths, entries[position][1] - start)]
+                del starts[position]
+                del entries[position]
+                return
+            position += 1
+
+    def overlapping(self, key, start, end):
+        """
+        Find intervals under ``key`` overlapping [start, end).
+
+        Returns:
+            list: Primary keys of the overlapping intervals.
+        """
+        starts = self.starts.get(key)
+        if not starts:
+            return []
+        entries = self.entries[key]
+        low = bisect_right(starts, start - self.lengths[key][-1])
+        high = bisect_left(starts, end)
+        return [pk for _, entry_end, pk in entries[low:high] if entry_end > start]
+
+    def keys(self):
+        """ Keys that have at least one indexed interval. """
+        return [key for key, starts in self.starts.items() if starts]
+
+
+class KeyedLocks:
+    """
+    One lock per key (e.g. a room id), created on demand and dropped once no thread
+    holds or waits for it. Work on the same key is serialized while different keys
+    proceed in parallel.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}  # key -> [lock, number of holders and waiters]
+
+    @contextmanager
+    def hold(self, key):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    @contextmanager
+    def hold_many(self, keys):
+        """ Hold the locks of several keys, always taken in sorted order to avoid deadlocks. """
+        with ExitStack() as stack:
+            for key in sorted(set(keys)):
+                stack.enter_context(self.hold(key))
+            yield
+
+
+# Held while checking and changing the bookings of a room
+room_locks = KeyedLocks()
@@ -0,0 +1,337 @@
+"""
+Benchmarks of the main endpoints, run in-process against `main.app`.
+
+Every dataset size runs in a fresh interpreter inside a temporary directory seeded
+with synthetic data: ``database/rooms.json`` and ``database/bookings.json`` for the
+JSON store, and ``database.db`` for the SQL store and the heroes and teams.
+
+    python benchmark.py run --sizes 1000 10000 100000 --output results.json
+    python benchmark.py run --baseline results.json --threshold 0.2
+    python benchmark.py compare results.json new-results.json --threshold 0.2
+
+A comparison fails (exit status 1) when a scenario's p99 latency grew, or its
+throughput dropped, by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOM_TYPES = ("Single", "Double", "Suite")
+
+
+def seed(size):
+    """ Write ``size`` rooms, bookings, teams and heroes to the stores of the current directory. """
+    rooms = [
+        {"room_type": ROOM_TYPES[i % 3], "price_per_night": 50.0 + i % 200, "available": False, "id": str(uuid.uuid4())}
+        for i in range(size)
+    ]
+    start = datetime(2030, 1, 1, 14)
+    bookings = [
+        {
+            "start_datetime": (start + timedelta(days=3 * (i // size))).isoformat(),
+            "end_datetime": (start + timedelta(days=3 * (i // size) + 2, hours=-4)).isoformat(),
+            "room_id": rooms[i % size]["id"],
+            "guest_name": f"Guest {i}",
+            "nights": 2,
+            "total_price": 2 * rooms[i % size]["price_per_night"],
+            "id": str(uuid.uuid4()),
+        }
+        for i in range(size)
+    ]
+    os.makedirs("database", exist_ok=True)
+    for name, records in (("rooms", rooms), ("bookings", bookings)):
+        with open(os.path.join("database", f"{name}.json"), "w") as f:
+            json.dump(records, f)
+
+    from sqlalchemy import insert
+    from sqlmodel import Session, SQLModel
+
+    from models import BookingTable, Hero, RoomTable, Team, engine
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(insert(RoomTable), [{**room, "id": uuid.UUID(room["id"])} for room in rooms])
+        session.execute(insert(BookingTable), [
+            {
+                **booking,
+                "id": uuid.UUID(booking["id"]),
+                "room_id": uuid.UUID(booking["room_id"]),
+                "start_datetime": datetime.fromisoformat(booking["start_datetime"]),
+                "end_datetime": datetime.fromisoformat(booking["end_datetime"]),
+            }
+            for booking in bookings
+        ])
+        session.execute(insert(Team), [{"name": f"Team {i}", "headquarters": f"City {i % 50}"} for i in range(size)])
+        session.execute(insert(Hero), [
+            {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": 20 + i % 50, "team_id": 1 + i % size}
+            for i in range(size)
+        ])
+        session.commit()
+    return rooms
+
+
+def summarize(latencies, elapsed, errors):
+    """ Throughput and latency percentiles, in milliseconds, of one scenario. """
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+async def drive(send, requests, concurrency):
+    """ Call ``await send(i)`` for i in range(requests), ``concurrency`` at a time. """
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+class WebSocketClient:
+    """ Minimal ASGI websocket client, talking to the app on the same event loop. """
+
+    def __init__(self, app, path, query_string=b""):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": path,
+            "raw_path": path.encode(), "query_string": query_string, "root_path": "", "headers": [],
+            "client": ("127.0.0.1", 0), "server": ("bench", 80), "subprotocols": [],
+        }
+        self.task = asyncio.create_task(app(scope, self.outgoing.get, self.incoming.put))
+
+    async def connect(self):
+        await self.outgoing.put({"type": "websocket.connect"})
+        message = await self.incoming.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"Websocket refused: {message}")
+        return self
+
+    async def send(self, text):
+        await self.outgoing.put({"type": "websocket.receive", "text": text})
+
+    async def receive(self):
+        return (await self.incoming.get())["text"]
+
+    async def close(self):
+        await self.outgoing.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+async def chat_fan_out(app, clients, messages):
+    """ Latency from a chat message being sent to each member of its channel receiving it. """
+    sender = await WebSocketClient(app, "/ws/0", b"channel=bench").connect()
+    receivers = [await WebSocketClient(app, f"/ws/{i}", b"channel=bench").connect() for i in range(1, clients + 1)]
+    latencies = []
+    start = time.perf_counter()
+    for message in range(messages):
+        sent = time.perf_counter()
+        await sender.send(str(message))
+        await sender.receive()  # "You wrote: ..."
+        for receiver in receivers:
+            await receiver.receive()
+            latencies.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - start
+    for client in (sender, *receivers):
+        await client.close()
+    return summarize(latencies, elapsed, 0)
+
+
+async def run_scenarios(size, rooms, requests, concurrency, ws_clients, ws_messages):
+    import httpx
+
+    import main
+    from configs import get_settings
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        booking_start = datetime(2040, 1, 1, 14)
+
+        def book(i):
+            start = booking_start + timedelta(days=3 * (i // size))
+            return client.post("/bookings/", data={
+                "room_id": rooms[i % size]["id"],
+                "guest_name": f"Bench {i}",
+                "start_datetime": start.isoformat(),
+                "end_datetime": (start + timedelta(days=2, hours=-4)).isoformat(),
+                "nights": 1,
+            })
+
+        def heroes_read_write(i):
+            if i % 5 == 0:
+                return client.post("/heroes/", json={"name": f"New {i}", "secret_name": "x", "team_id": 1})
+            return client.get("/heroes/")
+
+        scenarios = {
+            "POST /bookings/": book,
+            "GET /rooms/?room_type=Single": lambda i: client.get("/rooms/", params={"room_type": "Single"}),
+            "GET /teams/": lambda i: client.get("/teams/"),
+            "GET+POST /heroes/ (4:1)": heroes_read_write,
+            "GET /bookings/": lambda i: client.get("/bookings/"),
+        }
+        for name, send in scenarios.items():
+            results[name] = await drive(send, requests, concurrency)
+
+        get_settings().fast_json_responses = True
+        results["GET /bookings/ (fast_json)"] = await drive(lambda i: client.get("/bookings/"), requests, concurrency)
+        get_settings().fast_json_responses = False
+        for name in ("GET /bookings/", "GET /bookings/ (fast_json)"):
+            results[name]["p50_us_per_item"] = round(results[name]["p50_ms"] * 1000 / size, 3)
+
+    results[f"/ws/{{client_id}} fan-out ({ws_clients} clients)"] = await chat_fan_out(main.app, ws_clients, ws_messages)
+    return results
+
+
+def run_size(args):
+    """ Child process: seed the current directory and benchmark one dataset size. """
+    rooms = seed(args.size)
+    results = asyncio.run(run_scenarios(
+        args.size, rooms, args.requests, args.concurrency, args.ws_clients, args.ws_messages,
+    ))
+    with open(args.output, "w") as f:
+        json.dump(results, f)
+
+
+def run(args):
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": args.backend,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "response_cache": args.cache,
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="hotel-bench-") as workdir:
+            for name in ("static", "templates"):
+                os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+            if os.path.exists(os.path.join(REPO_DIR, ".env")):
+                shutil.copy(os.path.join(REPO_DIR, ".env"), workdir)
+            env = {
+                **os.environ,
+                "PYTHONPATH": os.pathsep.join(filter(None, (REPO_DIR, os.environ.get("PYTHONPATH")))),
+                "STORAGE_BACKEND": args.backend,
+                "DATABASE_URL": "sqlite:///database.db",
+                "ERROR_LOG_PATH": os.path.join(workdir, "errors.txt"),
+            }
+            env.setdefault("ADMIN_EMAIL", "bench@example.com")
+            if not args.cache:
+                env["RESPONSE_CACHE_TTL"] = "0"
+            output = os.path.join(workdir, "results.json")
+            print(f"Benchmarking {size} records...", file=sys.stderr)
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__), "_size", str(size), output,
+                "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                "--ws-clients", str(args.ws_clients), "--ws-messages", str(args.ws_messages),
+            ], cwd=workdir, env=env, check=True)
+            with open(output) as f:
+                report["results"][str(size)] = json.load(f)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            return compare_reports(json.load(f), report, args.threshold)
+    return 0
+
+
+def print_report(report):
+    for size, scenarios in report["results"].items():
+        print(f"\n{size} records")
+        for name, result in scenarios.items():
+            print(f"  {name:<45} {result['throughput_rps']:>10.1f}/s  p50 {result['p50_ms']:>9.3f} ms  "
+                  f"p99 {result['p99_ms']:>9.3f} ms  errors {result['errors']}")
+
+
+def compare_reports(baseline, current, threshold):
+    """
+    Print how each scenario changed from ``baseline`` to ``current``.
+
+    Returns:
+        int: 1 if any p99 latency rose or throughput fell by more than ``threshold`` (a fraction), else 0.
+    """
+    regressions = 0
+    for size, scenarios in current["results"].items():
+        for name, result in scenarios.items():
+            before = baseline["results"].get(size, {}).get(name)
+            if before is None:
+                continue
+            p99 = result["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+            throughput = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            regressed = p99 > threshold or throughput < -threshold
+            regressions += regressed
+            status = 'REGRESSION' if regressed else 'ok'
+            print(f"{status:<10} {size:>7} {name:<45} p99 {p99:+.1%}  throughput {throughput:+.1%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    run_parser.add_argument("--backend", choices=("json", "sql"), default="json", help="Storage of rooms and bookings")
+    run_parser.add_argument("--output", help="Save the results to this JSON file")
+    run_parser.add_argument("--baseline", help="Compare the results with this earlier JSON file")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Tolerated regression (0.2 = 20%%)")
+    run_parser.add_argument("--cache", action="store_true", help="Keep the response cache enabled")
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+
+    size_parser = commands.add_parser("_size")
+    size_parser.add_argument("size", type=int)
+    size_parser.add_argument("output")
+
+    for sub in (run_parser, size_parser):
+        sub.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+        sub.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+        sub.add_argument("--ws-clients", type=int, default=1000, help="Websocket clients of the fan-out scenario")
+        sub.add_argument("--ws-messages", type=int, default=20, help="Messages broadcast in the fan-out scenario")
+
+    args = parser.parse_args()
+    if args.command == "_size":
+        return run_size(args)
+    if args.command == "compare":
+        with open(args.baseline) as f, open(args.current) as g:
+            return compare_reports(json.load(f), json.load(g), args.threshold)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class CachedResponse:
+    """ A complete response body with its status, headers and ETag. """
+    status: int
+    headers: list
+    body: bytes
+    etag: str
+
+
+class CacheBackend:
+    """
+    Interface of the response cache storage.
+
+    Entries are stored under a key and labelled with tags naming the data they were
+    built from, so a write can drop every entry depending on it. Implement these
+    methods to plug in a shared cache (e.g. Redis) instead of the in-process LRU.
+    """
+
+    def get(self, key):
+        """ Return the CachedResponse stored under ``key``, or None. """
+        raise NotImplementedError
+
+    def generation(self, tags):
+        """ Return a token that changes whenever any of ``tags`` is invalidated. """
+        raise NotImplementedError
+
+    def set(self, key, value, tags, generation=None):
+        """
+        Store ``value`` under ``key``, labelled with ``tags``. If ``generation`` is
+        given and ``generation(tags)`` changed since, the value was built from data
+        invalidated meanwhile and is not stored.
+        """
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        """ Drop every entry labelled with any of ``tags``. """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Drop every entry. """
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache keeping the ``maxsize`` most recently used entries, each for
+    at most ``ttl`` seconds. Each tag has a generation counter, bumped when the tag
+    is invalidated (and for every tag when the cache is cleared).
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> keys labelled with it
+        self._generations = {}  # tag -> number of invalidations
+        self._epoch = 0  # Number of clears
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, tags):
+        with self._lock:
+            return self._generation(tags)
+
+    def set(self, key, value, tags, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation(tags):
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def _generation(self, tags):
+        return self._epoch, tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+
+# Methods that change data, and so drop the cached entries built from it
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware caching successful GET responses of selected routes.
+
+    ``cached_routes`` and ``invalidations`` are lists of (path regex, tags) pairs.
+    A GET whose path fully matches a cached route is answered from the cache, keyed
+    by path and query string, and labelled with the route's tags. A POST, PUT, PATCH
+    or DELETE whose path starts with an invalidation pattern drops the entries
+    labelled with its tags once it completes; HEAD and OPTIONS requests never do. A
+    response is only cached if none of its tags was invalidated while it was being
+    built, so a GET racing a write never caches the data from before the write.
+    Cached responses carry an ETag, and a request whose If-None-Match matches it
+    gets an empty 304.
+    """
+
+    def __init__(self, app, backend, cached_routes, invalidations):
+        self.app = app
+        self.backend = backend
+        self.cached_routes = [(re.compile(pattern), frozenset(tags)) for pattern, tags in cached_routes]
+        self.invalidations = [(re.compile(pattern), frozenset(tags)) for pattern, tags in invalidations]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if scope["method"] == "GET":
+            for pattern, tags in self.cached_routes:
+                if pattern.fullmatch(path):
+                    return await self._serve_cached(scope, receive, send, tags)
+            return await self.app(scope, receive, send)
+        if scope["method"] not in WRITE_METHODS:
+            return await self.app(scope, receive, send)
+
+        tags = {tag for pattern, route_tags in self.invalidations if pattern.match(path) for tag in route_tags}
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tags:
+                self.backend.invalidate(tags)
+
+    async def _serve_cached(self, scope, receive, send, tags):
+        key = f"{scope['path']}?{scope['query_string'].decode('latin-1')}"
+        cached = self.backend.get(key)
+        state = b"HIT"
+        if cached is None:
+            state = b"MISS"
+            generation = self.backend.generation(tags)
+            start = {}
+            chunks = []
+
+            async def capture(message):
+                if message["type"] == "http.response.start":
+                    start.update(message)
+                else:
+                    chunks.append(message.get("body", b""))
+
+            await self.app(scope, receive, capture)
+            body = b"".join(chunks)
+            if start["status"] != 200:
+                await send({**start, "headers": list(start.get("headers", []))})
+                await send({"type": "http.response.body", "body": body})
+                return
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            cached = CachedResponse(start["status"], [*start.get("headers", []), (b"etag", etag.encode())], body, etag)
+            self.backend.set(key, cached, tags, generation)
+
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match")
+        if _etag_matches(if_none_match.decode("latin-1") if if_none_match else None, cached.etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", cached.etag.encode()), (b"x-cache", state)],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": cached.status,
+            "headers": [*cached.headers, (b"x-cache", state)],
+        })
+        await send({"type": "http.response.body", "body": cached.body})
@@ -0,0 +1,176 @@
+import asyncio
+from collections import OrderedDict, deque
+
+from fastapi import WebSocket
+
+from pubsub import LocalPubSub
+
+# Channel of clients that do not pick one
+DEFAULT_CHANNEL = "chat"
+
+# Close code sent to a client evicted for not keeping up ("Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Connection:
+    """
+    A websocket with a bounded queue of outgoing messages and the task writing them.
+
+    Broadcasting only puts messages on the queue, so a slow client delays nobody but
+    itself; once its queue is full, the manager applies its slow consumer policy.
+    """
+
+    def __init__(self, websocket: WebSocket, channel, max_queue, on_error):
+        self.websocket = websocket
+        self.channel = channel
+        self.queue = asyncio.Queue(max_queue)
+        self.dropped = 0
+        self._on_error = on_error
+        self.writer = asyncio.create_task(self._write())
+
+    def offer(self, message):
+        """ Queue an ASGI send message without waiting. Returns False if the queue is full. """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop_oldest(self, message):
+        """ Make room for ``message`` by discarding the oldest queued message. """
+        self.queue.get_nowait()
+        self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def _write(self):
+        try:
+            while True:
+                await self.websocket.send(await self.queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The client went away mid-send, stop delivering to it
+            self._on_error(self.websocket)
+
+    def close(self):
+        """ Stop the writer task; messages still queued are discarded. """
+        self.writer.cancel()
+
+
+class ConnectionManager:
+    """
+    Tracks the open chat websockets by channel and fans messages out to them.
+
+    Each websocket joins one channel (e.g. one per room or booking) and a broadcast
+    only reaches the members of its channel, so it costs O(members) no matter how
+    many sockets are open. Every message is turned into its ASGI send message once
+    and that same object is queued for every receiver. Each connection has its own
+    writer task, so broadcast never waits for a client to read.
+
+    The last ``history_size`` messages of each channel are kept in a ring buffer and
+    replayed to whoever joins it; histories of the ``max_channels`` most recently used
+    channels are kept. Broadcasts are also published on ``pubsub`` so the other worker
+    processes deliver them to their own members, and the messages they publish arrive
+    the same way.
+
+    Attributes:
+        connections (dict): Connection of each websocket.
+        channels (dict): Connections of each channel with at least one member, by websocket.
+        history (OrderedDict): Recent messages of each channel, least recently used first.
+        max_queue (int): Messages that may wait for a client before it counts as slow.
+        slow_consumer_policy (str): "drop" discards the oldest message queued for a slow
+            client, "disconnect" closes its websocket with code 1013.
+        pubsub (PubSubBackend): Relay to the other workers, started with the first connection.
+    """
+
+    def __init__(self, max_queue=256, slow_consumer_policy="drop", pubsub=None, history_size=50, max_channels=1024):
+        self.connections: dict[WebSocket, Connection] = {}
+        self.channels: dict[str, dict[WebSocket, Connection]] = {}
+        self.history = OrderedDict()
+        self.history_size = history_size
+        self.max_channels = max_channels
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.pubsub = pubsub or LocalPubSub()
+        self._pubsub_started = False
+        self._closing = set()
+
+    async def connect(self, websocket: WebSocket, channel=DEFAULT_CHANNEL):
+        """ Accept ``websocket`` into ``channel`` and replay the channel's recent messages to it. """
+        if not self._pubsub_started:
+            self._pubsub_started = True
+            await self.pubsub.start(self._receive)
+        await websocket.accept()
+        connection = Connection(websocket, channel, self.max_queue, self.disconnect)
+        self.connections[websocket] = connection
+        self.channels.setdefault(channel, {})[websocket] = connection
+        for message in self.history.get(channel, ()):
+            connection.offer(message)
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.close()
+        members = self.channels[connection.channel]
+        del members[websocket]
+        if not members:
+            del self.channels[connection.channel]
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._deliver(connection, {"type": "websocket.send", "text": message})
+
+    async def broadcast(self, message: str, websocket: WebSocket | None = None, channel=DEFAULT_CHANNEL):
+        """ Queue ``message`` for every member of ``channel``, in every worker, except ``websocket``, the sender. """
+        self._fan_out(channel, message, websocket)
+        await self.pubsub.publish(channel, message)
+
+    async def _receive(self, channel, message):
+        """ Deliver a message another worker published. """
+        self._fan_out(channel, message)
+
+    async def close(self):
+        """ Disconnect from the other workers. """
+        await self.pubsub.close()
+
+    def _fan_out(self, channel, message, sender=None):
+        message = {"type": "websocket.send", "text": message}
+        self._remember(channel, message)
+        for receiver, connection in list(self.channels.get(channel, {}).items()):
+            if receiver is not sender:
+                self._deliver(connection, message)
+
+    def _remember(self, channel, message):
+        """ Append to the channel's ring buffer, forgetting the least recently used channel if needed. """
+        history = self.history.get(channel)
+        if history is None:
+            history = self.history[channel] = deque(maxlen=self.history_size)
+            if len(self.history) > self.max_channels:
+                self.history.popitem(last=False)
+        else:
+            self.history.move_to_end(channel)
+        history.append(message)
+
+    def _deliver(self, connection, message):
+        if connection.offer(message):
+            return
+        if self.slow_consumer_policy == "drop":
+            connection.drop_oldest(message)
+        else:
+            self._evict(connection.websocket)
+
+    def _evict(self, websocket: WebSocket):
+        """ Disconnect a client that stopped reading, telling it why when possible. """
+        self.disconnect(websocket)
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Too slow")
+        except Exception:
+            pass
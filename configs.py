@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,5 +8,34 @@ class Settings(BaseSettings):
     app_name: str = "Awesome API"
     admin_email: str
     items_per_user: int = 50
+    storage_backend: Literal["json", "sql"] = "json"  # Where rooms and bookings are stored
+    database_url: str = "sqlite:///database.db"
+    async_database_url: str | None = None  # Defaults to database_url with its async driver
+    database_echo: bool = False  # Log every SQL statement, for debugging only
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # Bytes of the database file to memory-map
+    sqlite_cache_size: int = -64000  # Page cache size; negative values are in KiB
+    response_cache_size: int = 1024  # Cached GET responses kept per process
+    response_cache_ttl: float = 30.0  # Seconds a cached response may be served
+    fast_json_responses: bool = False  # Serialize list responses with compiled Pydantic serializers
+    chat_send_queue_size: int = 256  # Messages that may wait for a chat client before it counts as slow
+    chat_slow_consumer_policy: Literal["drop", "disconnect"] = "drop"  # Drop its oldest message, or close it
+    chat_pubsub_backend: Literal["local", "unix"] = "local"  # "unix" relays chat between the workers of a host
+    chat_pubsub_path: str = "chat.sock"  # Socket of the "unix" chat broker
+    chat_history_size: int = 50  # Recent messages of each chat channel replayed to clients joining it
+    error_log_path: str = "errors.txt"
+    error_log_max_bytes: int = 1024 * 1024  # Size at which the error log is rotated
+    error_log_backup_count: int = 5  # Rotated error logs kept
+    error_log_rate: float = 10.0  # Error log entries written per second at most
+    error_log_repeat_interval: float = 60.0  # Seconds between summaries of a repeating error
+    metrics_enabled: bool = True  # Record request latencies and SQL timings for /metrics
+    admin_token: str | None = None  # Expected in X-Admin-Token by the /admin routes, disabled when unset
+    create_schema_on_startup: bool = False  # Otherwise tables are created on first use or by migrate.py
 
     model_config = SettingsConfigDict(env_file=".env")
+
+
+@lru_cache
+def get_settings():
+    return Settings()
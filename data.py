@@ -1,6 +1,425 @@
+import atexit
 import json
 import os
+import threading
+import time
 import uuid
+from contextlib import contextmanager
+
+from sqlmodel import Session, select
+
+from availability import IntervalIndex, parse_datetime
+from configs import get_settings
+from metrics import timed, to_thread
+from models import BookingTable, RoomTable, engine, ensure_schema
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _acquire_file_lock(file, blocking=True):
+    """
+    Take the exclusive lock on ``file`` shared by every process opening it.
+
+    Returns:
+        bool: False if ``blocking`` is False and another process holds the lock.
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    # Lock the first byte; retry here as msvcrt gives up after 10 seconds
+    os.lseek(file.fileno(), 0, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.01)
+
+
+def _release_file_lock(file):
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_UN)
+    else:
+        os.lseek(file.fileno(), 0, os.SEEK_SET)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _ModelStore:
+    """
+    Process-wide in-memory copy of a single model's data.
+
+    The data is loaded once, records are indexed by their ``id`` and reads only
+    touch memory. Changes are persisted in one of two modes:
+
+    * snapshot: a background thread rewrites the whole JSON file a short while after
+      the first pending change, so a burst of writes shares a single rewrite.
+    * journal: every change is appended as one JSON line to ``<model>.jsonl`` before
+      the call returns, so a write costs O(1) bytes. Once the journal grows past
+      ``compact_after`` entries, the background thread folds it into the JSON
+      snapshot and empties it. On load the snapshot is read and the journal replayed
+      on top of it.
+
+    Replaying an entry is idempotent (create stores the full record, update merges
+    fields, delete pops), so a crash at any point of a compaction recovers by simply
+    replaying the journal again. A torn last line left by a crash mid-append is
+    dropped.
+
+    Records are treated as immutable: updates replace the stored dict instead of
+    mutating it, which lets the flusher serialize a snapshot without holding the lock.
+
+    In journal mode several processes (e.g. uvicorn workers) share the files. Appends
+    and compactions hold an exclusive lock on ``<model>.lock``, after catching up with
+    what the other processes wrote: the snapshot is reloaded if it was compacted since
+    it was read, then the journal lines not applied yet are replayed. Reads check the
+    journal's size and the snapshot's identity (two ``stat`` calls) and catch up the
+    same way when either changed.
+
+    In snapshot mode the process owns the file: it holds an exclusive lock on
+    ``<model>.lock`` for its whole life, and a second process loading the same model
+    fails instead of silently overwriting the other's changes.
+
+    Attributes:
+        file_name (str): Full path to the model's JSON snapshot file.
+        journal_name (str or None): Full path to the journal, None in snapshot mode.
+        lock_name (str): Full path to the file locked to coordinate processes.
+        records (dict): Records keyed by their ``id``, in insertion order.
+        lock (threading.RLock): Guards ``records`` and the interval indexes.
+    """
+
+    flush_interval = 0.5  # Seconds to wait for more writes before flushing a batch
+    compact_after = 1000  # Journal entries appended before a compaction is scheduled
+    fsync = False  # Force every journal append to disk, surviving OS crashes too
+
+    def __init__(self, file_name, journal=False):
+        self.file_name = file_name
+        self.journal_name = f"{os.path.splitext(file_name)[0]}.jsonl" if journal else None
+        self.lock_name = f"{os.path.splitext(file_name)[0]}.lock"
+        self.lock = threading.RLock()
+        self.records = {}
+        self._dirty = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._exclusive_lock = threading.RLock()  # Held by the thread holding the lock file
+        self._exclusive_depth = 0
+        self._journal = None
+        self._journal_entries = 0
+        self._journal_offset = 0  # Bytes of the journal applied to ``records``
+        self._snapshot_id = None  # Identity of the snapshot file ``records`` was loaded from
+        self._interval_indexes = {}
+        self._lock_file = open(self.lock_name, 'a')
+        if self.journal_name is None:
+            self._own()
+            self._load()
+        else:
+            self._journal = open(self.journal_name, 'ab')
+            with self.exclusive():
+                pass  # Loads the snapshot and replays the journal
+
+    def _own(self):
+        """ Take the snapshot file for this process, or fail if another process has it. """
+        if not _acquire_file_lock(self._lock_file, blocking=False):
+            self._lock_file.close()
+            raise RuntimeError(
+                f"{self.file_name} is used by another process; only the journal mode supports several processes"
+            ) from None
+
+    @staticmethod
+    def _file_id(file):
+        """ Changes whenever the file is replaced or rewritten. """
+        stat = os.stat(file)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """ (Re)load ``records`` from the JSON snapshot, creating an empty one if missing. """
+        if not os.path.exists(self.file_name):
+            self._write_snapshot([])
+        with open(self.file_name, 'r') as f:
+            self._snapshot_id = self._file_id(f.fileno())
+            data = json.load(f)
+        with self.lock:
+            self.records = {item["id"]: item for item in data}
+            for fields in self._interval_indexes:
+                self._interval_indexes[fields] = self._build_index(fields)
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def _catch_up(self):
+        """ Apply the changes written by other processes. Needs the lock file. """
+        if not os.path.exists(self.file_name) or self._file_id(self.file_name) != self._snapshot_id:
+            self._load()
+        with open(self.journal_name, 'rb') as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Torn by a process that crashed while appending, as nobody else is appending now
+            os.truncate(self.journal_name, self._journal_offset + end)
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        with self.lock:
+            for entry in entries:
+                self._apply(entry)
+        self._journal_offset += end
+        self._journal_entries += len(entries)
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Hold the store for a change: until exiting, no other thread or process writes
+        or compacts it, and ``records`` includes every change made so far. Reentrant.
+        """
+        with self._exclusive_lock:
+            outermost = self._exclusive_depth == 0 and self.journal_name is not None
+            if outermost:
+                _acquire_file_lock(self._lock_file)
+            self._exclusive_depth += 1
+            try:
+                if outermost:
+                    self._catch_up()
+                yield
+            finally:
+                self._exclusive_depth -= 1
+                if outermost:
+                    _release_file_lock(self._lock_file)
+
+    def stale(self):
+        """ Whether other processes changed the files since ``records`` was last brought up to date. """
+        if self.journal_name is None:
+            return False
+        try:
+            return (
+                os.path.getsize(self.journal_name) != self._journal_offset
+                or self._file_id(self.file_name) != self._snapshot_id
+            )
+        except FileNotFoundError:
+            return True
+
+    def sync(self):
+        """ Catch up with the changes of other processes, if any. Costs two ``stat`` calls otherwise. """
+        if self.stale():
+            with self.exclusive():
+                pass
+
+    def _apply(self, entry):
+        op = entry["op"]
+        old = self.records.get(entry.get("id"))
+        new = None
+        if op == "create":
+            new = self.records[entry["record"]["id"]] = entry["record"]
+        elif op == "update":
+            if old is not None:
+                new = self.records[entry["id"]] = {**old, **entry["fields"]}
+        elif op == "delete":
+            self.records.pop(entry["id"], None)
+        for fields, index in self._interval_indexes.items():
+            if old is not None:
+                self._unindex(index, fields, old)
+            if new is not None:
+                self._index(index, fields, new)
+
+    @staticmethod
+    def _index(index, fields, item):
+        key, start, end = (item.get(field) for field in fields)
+        if key is not None and start is not None and end is not None:
+            index.add(key, parse_datetime(start), parse_datetime(end), item["id"])
+
+    @staticmethod
+    def _unindex(index, fields, item):
+        key, start, _ = (item.get(field) for field in fields)
+        if key is not None and start is not None:
+            index.remove(key, parse_datetime(start), item["id"])
+
+    def _build_index(self, fields):
+        index = IntervalIndex()
+        for item in self.records.values():
+            self._index(index, fields, item)
+        return index
+
+    def interval_index(self, key_field, start_field, end_field):
+        """
+        Return an IntervalIndex over the records, built on first use and kept in
+        sync with every later change.
+        """
+        fields = (key_field, start_field, end_field)
+        with self.lock:
+            index = self._interval_indexes.get(fields)
+            if index is None:
+                index = self._interval_indexes[fields] = self._build_index(fields)
+            return index
+
+    def _log(self, *entries):
+        """
+        Apply changes in memory and persist them according to the store's mode.
+        Several entries are appended to the journal with a single write.
+        """
+        if not entries:
+            return
+        with self.exclusive():
+            with self.lock:
+                for entry in entries:
+                    self._apply(entry)
+            if self._journal is None:
+                self.mark_dirty()
+                return
+            data = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+            self._journal.write(data)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._journal_offset += len(data)
+            self._journal_entries += len(entries)
+            if self._journal_entries >= self.compact_after:
+                self.mark_dirty()
+
+    def put(self, *records):
+        """ Store new records under their ``id``. """
+        self._log(*({"op": "create", "record": record} for record in records))
+
+    def patch(self, pk, fields):
+        """
+        Merge ``fields`` into an existing record.
+
+        Returns:
+            dict or None: The updated record, or None if not found.
+        """
+        return self.patch_many([(pk, fields)])[0]
+
+    def patch_many(self, updates):
+        """
+        Merge fields into several existing records at once.
+
+        Args:
+            updates (list): (pk, fields) pairs.
+
+        Returns:
+            list: The updated record, or None if not found, for each pair.
+        """
+        with self.exclusive():
+            found = [(pk, fields) for pk, fields in updates if pk in self.records]
+            self._log(*({"op": "update", "id": pk, "fields": fields} for pk, fields in found))
+            return [self.records.get(pk) if pk in self.records else None for pk, _ in updates]
+
+    def remove(self, pk):
+        """
+        Remove a record.
+
+        Returns:
+            bool: True if a record was removed, False otherwise.
+        """
+        return self.remove_many([pk])[0]
+
+    def remove_many(self, pks):
+        """
+        Remove several records at once.
+
+        Returns:
+            list: True if the record was removed, False otherwise, for each pk.
+        """
+        with self.exclusive():
+            removed = []
+            seen = set()
+            for pk in pks:
+                removed.append(pk in self.records and pk not in seen)
+                seen.add(pk)
+            self._log(*({"op": "delete", "id": pk} for pk, ok in zip(pks, removed) if ok))
+            return removed
+
+    def mark_dirty(self):
+        """ Schedule a background flush of the current snapshot. """
+        self._dirty.set()
+        if self._flusher is None:
+            with self.lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(
+                        target=self._flush_loop, name=f"flush-{self.file_name}", daemon=True
+                    )
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            # Give concurrent writers a moment so they share one rewrite
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error while flushing {self.file_name}: {e}")
+
+    def flush(self):
+        """
+        Write pending changes to the JSON snapshot.
+
+        The snapshot is written to a temporary file and atomically moved over the
+        original, so readers of the file never observe a half-written list. In
+        journal mode the lock file is held from catching up with every process's
+        changes until the journal is emptied in place, so no append is lost and the
+        other processes keep appending to the same file.
+        """
+        if self.journal_name is None:
+            with self._flush_lock:
+                with self.lock:
+                    if not self._dirty.is_set():
+                        return
+                    self._dirty.clear()
+                    snapshot = list(self.records.values())
+                self._write_snapshot(snapshot)
+            return
+
+        with self.exclusive():
+            self._dirty.clear()
+            if not self._journal_entries:
+                return
+            with self.lock:
+                snapshot = list(self.records.values())
+            self._write_snapshot(snapshot)
+            os.ftruncate(self._journal.fileno(), 0)
+            self._snapshot_id = self._file_id(self.file_name)
+            self._journal_offset = 0
+            self._journal_entries = 0
+
+    def _write_snapshot(self, snapshot):
+        tmp_name = f"{self.file_name}.tmp"
+        with open(tmp_name, 'w') as f:
+            json.dump(snapshot, f, indent=4)
+        os.replace(tmp_name, self.file_name)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(file_name, journal):
+    """
+    Return the shared store for ``file_name``, loading it on first use.
+    The persistence mode is fixed by whoever loads the store first.
+    """
+    store = _stores.get(file_name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(file_name)
+            if store is None:
+                store = _stores[file_name] = _ModelStore(file_name, journal=journal)
+    return store
+
+
+@atexit.register
+def flush_all():
+    """ Flush every loaded store to disk. Registered to run at interpreter exit. """
+    for store in list(_stores.values()):
+        store.flush()
 
 
 class DummyDataBase:
@@ -8,57 +427,112 @@ class DummyDataBase:
     DummyDataBase is a simple file-based data management class that mimics basic CRUD
     operations on model-like entities using the file system and JSON storage.
 
+    All instances for the same model share one in-memory store, so creating a
+    DummyDataBase per request is cheap and lookups by primary key are O(1).
+    In journal mode, every call first catches up with the changes made by other
+    processes sharing the files, unless reads are told not to with ``catch_up=False``.
+    By default every change is appended to a per-model journal file and periodically
+    compacted into the JSON file; with ``journal=False`` the JSON file is rewritten
+    in the background instead.
+
     Attributes:
         model (str): The name of the model (used as the filename).
         db_dir (str): Directory where the JSON file is stored.
         file_name (str): Full path to the model's JSON file.
+        catch_up (bool): Whether reads first catch up with the changes of other processes.
+        interval_fields (tuple): Key, start and end fields used by ``overlapping``.
     """
 
-    def __init__(self, model):
+    interval_fields = ("room_id", "start_datetime", "end_datetime")
+
+    def __init__(self, model, journal=True, catch_up=True):
         """
         Initialize the DummyDataBase with a model name.
         Creates a directory and file for storing the data if they don't exist.
 
         Args:
             model (str): The model name used as the JSON filename.
+            journal (bool): Persist changes through the append-only journal.
+            catch_up (bool): Catch up with other processes before reads. Pass False when
+                the caller just did, as catching up may wait for the lock file.
         """
         self.model = model
+        self.catch_up = catch_up
         self.db_dir = "database"
-        os.makedirs(self.db_dir, exist_ok=True)
         self.file_name = os.path.join(self.db_dir, f"{model}.json")
-        if not os.path.exists(self.file_name):
-            with open(self.file_name, 'w') as f:
-                json.dump([], f)
-    
-    def _read_data(self):
-        """
-        Internal helper to read all data from the JSON file.
+        if self.file_name not in _stores:
+            os.makedirs(self.db_dir, exist_ok=True)
+        self._store = _get_store(self.file_name, journal)
 
-        Returns:
-            list: List of all records.
+    def flush(self):
+        """ Fold pending changes of this model into its JSON file immediately. """
+        self._store.flush()
+
+    def exclusive(self):
         """
-        with open(self.file_name, 'r') as f:
-            return json.load(f)
+        Context manager holding the model for a check and the writes depending on it,
+        such as an overlap check and a booking: until exiting, no other thread or
+        process changes the model. Reentrant.
+        """
+        return self._store.exclusive()
+
+    def _catch_up(self):
+        if self.catch_up:
+            self._store.sync()
 
-    def _write_data(self, data):
+    @timed
+    def retrieve_all(self, **filters):
         """
-        Internal helper to write data to the JSON file.
+        Retrieve all records from the model's data store.
 
         Args:
-            data (list): The list of records to save.
+            **filters: Only return records whose fields equal these values.
+
+        Returns:
+            list: All matching records stored for the model.
         """
-        with open(self.file_name, 'w') as f:
-            json.dump(data, f, indent=4)
+        self._catch_up()
+        with self._store.lock:
+            return [
+                dict(item) for item in self._store.records.values()
+                if all(item.get(field) == value for field, value in filters.items())
+            ]
 
-    def retrieve_all(self):
+    def iter_batches(self, batch_size=500, start=None, end=None, **filters):
         """
-        Retrieve all records from the model's data store.
+        Iterate over the records in batches, holding the store lock for one batch at a time
+        so exports never copy the whole model at once.
 
-        Returns:
-            list: All records stored in the JSON file.
+        Args:
+            batch_size (int): Number of records per batch.
+            start (datetime, optional): Only yield records ending after this datetime.
+            end (datetime, optional): Only yield records starting before this datetime.
+            **filters: Only yield records whose fields equal these values.
+
+        Yields:
+            list: The next batch of matching records.
         """
-        return self._read_data()
+        start_field, end_field = self.interval_fields[1:]
+        # Normalized before streaming starts, so comparing naive and aware values can't fail mid-stream
+        start = parse_datetime(start) if start is not None else None
+        end = parse_datetime(end) if end is not None else None
+        self._catch_up()
+        with self._store.lock:
+            pks = list(self._store.records)
+        for offset in range(0, len(pks), batch_size):
+            with self._store.lock:
+                items = [self._store.records.get(pk) for pk in pks[offset:offset + batch_size]]
+                batch = [
+                    dict(item) for item in items
+                    if item is not None
+                    and all(item.get(field) == value for field, value in filters.items())
+                    and (start is None or parse_datetime(item[end_field]) > start)
+                    and (end is None or parse_datetime(item[start_field]) < end)
+                ]
+            if batch:
+                yield batch
 
+    @timed
     def retrieve(self, pk: uuid.UUID):
         """
         Retrieve a single record by its primary key.
@@ -69,12 +543,11 @@ class DummyDataBase:
         Returns:
             dict or None: The matching record or None if not found.
         """
-        data = self._read_data()
-        for item in data:
-            if item.get("id") == str(pk):
-                return item
-        return None
+        self._catch_up()
+        item = self._store.records.get(str(pk))
+        return dict(item) if item is not None else None
 
+    @timed
     def create(self, **kwargs):
         """
         Create a new record with the given keyword arguments.
@@ -85,13 +558,11 @@ class DummyDataBase:
         Returns:
             dict: The newly created record with a UUID.
         """
-        data = self._read_data()
-        new_id = str(uuid.uuid4())
-        kwargs["id"] = new_id
-        data.append(kwargs)
-        self._write_data(data)
-        return kwargs
+        kwargs["id"] = str(uuid.uuid4())
+        self._store.put(kwargs)
+        return dict(kwargs)
 
+    @timed
     def update(self, pk: uuid.UUID, **kwargs):
         """
         Update an existing record with new field values.
@@ -103,14 +574,78 @@ class DummyDataBase:
         Returns:
             dict or None: The updated record, or None if not found.
         """
-        data = self._read_data()
-        for index, item in enumerate(data):
-            if item.get("id") == str(pk):
-                data[index].update(kwargs)
-                self._write_data(data)
-                return data[index]
-        return None
+        item = self._store.patch(str(pk), kwargs)
+        return dict(item) if item is not None else None
+
+    @timed
+    def bulk_create(self, records):
+        """
+        Create many records with a single write.
+
+        Args:
+            records (list): Dicts of record fields.
+
+        Returns:
+            list: The newly created records with their UUIDs.
+        """
+        records = [{**record, "id": str(uuid.uuid4())} for record in records]
+        self._store.put(*records)
+        return [dict(record) for record in records]
+
+    @timed
+    def bulk_update(self, updates):
+        """
+        Update many records with a single write.
+
+        Args:
+            updates (list): (pk, fields) pairs.
+
+        Returns:
+            list: The updated record, or None if not found, for each pair.
+        """
+        updated = self._store.patch_many([(str(pk), fields) for pk, fields in updates])
+        return [dict(item) if item is not None else None for item in updated]
+
+    @timed
+    def bulk_delete(self, pks):
+        """
+        Delete many records with a single write.
+
+        Args:
+            pks (list): UUIDs of the records to delete.
+
+        Returns:
+            list: True if the record was deleted, False otherwise, for each pk.
+        """
+        return self._store.remove_many([str(pk) for pk in pks])
+
+    @timed
+    def overlapping(self, start, end, room_id=None):
+        """
+        Retrieve records whose ``start_datetime``/``end_datetime`` range overlaps
+        [start, end), such as the bookings conflicting with a new booking.
+        Answered from an interval index per ``room_id`` in O(log n + k).
 
+        Args:
+            start (datetime): Start of the range to check.
+            end (datetime): End of the range to check.
+            room_id (str, optional): Only check records of this room.
+
+        Returns:
+            list: The overlapping records.
+        """
+        start, end = parse_datetime(start), parse_datetime(end)
+        self._catch_up()
+        with self._store.lock:
+            index = self._store.interval_index(*self.interval_fields)
+            keys = [str(room_id)] if room_id is not None else index.keys()
+            return [
+                dict(self._store.records[pk])
+                for key in keys
+                for pk in index.overlapping(key, start, end)
+            ]
+
+    @timed
     def delete(self, pk: uuid.UUID) -> object:
         """
         Delete a record by its primary key.
@@ -121,10 +656,441 @@ class DummyDataBase:
         Returns:
             bool: True if a record was deleted, False otherwise.
         """
-        data = self._read_data()
-        new_data = [item for item in data if item.get("id") != str(pk)]
-        self._write_data(new_data)
-        return len(data) != len(new_data)
+        return self._store.remove(str(pk))
+
+
+class AsyncDummyDataBase:
+    """
+    Async counterpart of DummyDataBase for ``async def`` routes.
+
+    Reads are answered from the shared in-memory store without leaving the event
+    loop. Anything that may touch the disk (loading a model for the first time,
+    catching up with the writes of other processes and every write) runs in the event
+    loop's default executor, so it neither blocks the loop nor takes a slot in the
+    threadpool FastAPI uses for sync endpoints. Reads then go through a DummyDataBase
+    with ``catch_up=False``, so the loop never waits for the lock file.
+
+    Attributes:
+        model (str): The name of the model (used as the filename).
+        journal (bool): Persist changes through the append-only journal.
+    """
+
+    def __init__(self, model, journal=True):
+        """
+        Initialize the AsyncDummyDataBase with a model name.
+        The underlying store is loaded on first use if it isn't already.
+
+        Args:
+            model (str): The model name used as the JSON filename.
+            journal (bool): Persist changes through the append-only journal.
+        """
+        self.model = model
+        self.journal = journal
+        self._db = None
+        self._reader = None
+        if os.path.join("database", f"{model}.json") in _stores:
+            self._open()
+
+    def _open(self):
+        self._db = DummyDataBase(self.model, journal=self.journal)
+        self._reader = DummyDataBase(self.model, journal=self.journal, catch_up=False)
+
+    async def database(self):
+        """
+        Returns:
+            DummyDataBase: The synchronous interface over the same store.
+        """
+        if self._db is None:
+            await to_thread(self._open)
+        elif self._db._store.stale():
+            # Catch up with other processes without blocking the loop on the lock file
+            await to_thread(self._db._store.sync)
+        return self._db
+
+    async def _read(self):
+        """ The synchronous interface for reading on the loop, caught up by ``database()`` already. """
+        await self.database()
+        return self._reader
+
+    async def run_sync(self, func, *args, **kwargs):
+        """
+        Run ``func(db, *args, **kwargs)`` in the executor with the synchronous
+        interface, e.g. to hold a threading lock across several calls.
+        """
+        db = await self.database()
+        return await to_thread(func, db, *args, **kwargs)
+
+    async def retrieve_all(self, **filters):
+        """ Async version of DummyDataBase.retrieve_all. """
+        return (await self._read()).retrieve_all(**filters)
+
+    async def iter_batches(self, batch_size=500, start=None, end=None, **filters):
+        """ Async version of DummyDataBase.iter_batches. """
+        for batch in (await self._read()).iter_batches(batch_size, start, end, **filters):
+            yield batch
+
+    async def retrieve(self, pk: uuid.UUID):
+        """ Async version of DummyDataBase.retrieve. """
+        return (await self._read()).retrieve(pk)
+
+    async def overlapping(self, start, end, room_id=None):
+        """ Async version of DummyDataBase.overlapping. """
+        return (await self._read()).overlapping(start, end, room_id=room_id)
+
+    async def create(self, **kwargs):
+        """ Async version of DummyDataBase.create. """
+        return await self.run_sync(lambda db: db.create(**kwargs))
+
+    async def update(self, pk: uuid.UUID, **kwargs):
+        """ Async version of DummyDataBase.update. """
+        return await self.run_sync(lambda db: db.update(pk, **kwargs))
+
+    async def delete(self, pk: uuid.UUID) -> object:
+        """ Async version of DummyDataBase.delete. """
+        return await self.run_sync(lambda db: db.delete(pk))
+
+    async def bulk_create(self, records):
+        """ Async version of DummyDataBase.bulk_create. """
+        return await self.run_sync(lambda db: db.bulk_create(records))
+
+    async def bulk_update(self, updates):
+        """ Async version of DummyDataBase.bulk_update. """
+        return await self.run_sync(lambda db: db.bulk_update(updates))
+
+    async def bulk_delete(self, pks):
+        """ Async version of DummyDataBase.bulk_delete. """
+        return await self.run_sync(lambda db: db.bulk_delete(pks))
+
+
+# Session of the transaction held by SQLDataBase.exclusive() on each thread
+_transaction = threading.local()
+
+
+class SQLDataBase:
+    """
+    SQLDataBase offers the DummyDataBase CRUD interface on top of the SQLModel
+    engine, so rooms and bookings can live in indexed SQL tables instead of JSON
+    files. Records go in and come out as JSON-ready dicts, like with DummyDataBase.
+
+    Attributes:
+        model (str): The name of the model, a key of ``tables``.
+        table (type): The SQLModel table class storing the model.
+    """
+
+    tables = {"rooms": RoomTable, "bookings": BookingTable}
+
+    def __init__(self, model):
+        """
+        Initialize the SQLDataBase with a model name.
+
+        Args:
+            model (str): The model name, "rooms" or "bookings".
+        """
+        self.model = model
+        self.table = self.tables[model]
+        ensure_schema()
+
+    def _coerce(self, field, value):
+        """ Convert a JSON value (such as a UUID string) to the column's Python type. """
+        if self.table.model_fields[field].annotation is uuid.UUID and not isinstance(value, uuid.UUID):
+            return uuid.UUID(str(value))
+        return value
+
+    def flush(self):
+        """ Nothing to do, every change is committed immediately. """
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Run the calls made inside, on this thread, in one transaction that takes the write
+        lock of the database (SQLite) or of the model's table before its first query. A
+        check and the writes depending on it, such as an overlap check and a booking,
+        then can't interleave with another process's. Reentrant.
+        """
+        if getattr(_transaction, "session", None) is not None:
+            yield
+            return
+        with Session(engine) as session:
+            connection = session.connection()
+            if connection.dialect.name == "sqlite":
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            else:
+                connection.exec_driver_sql(f"LOCK TABLE {self.table.__tablename__} IN EXCLUSIVE MODE")
+            _transaction.session = session
+            try:
+                yield
+                session.commit()
+            finally:
+                _transaction.session = None
+
+    @contextmanager
+    def _session(self):
+        """ The session of the transaction held by ``exclusive()`` on this thread, or a new one. """
+        session = getattr(_transaction, "session", None)
+        if session is not None:
+            yield session
+            return
+        with Session(engine) as session:
+            yield session
+
+    @staticmethod
+    def _commit(session):
+        """ Commit the session, unless it belongs to ``exclusive()``, which commits once it exits. """
+        if session is getattr(_transaction, "session", None):
+            session.flush()
+        else:
+            session.commit()
+
+    @timed
+    def retrieve_all(self, **filters):
+        """
+        Retrieve all records, optionally filtered by field values through the indexes.
+
+        Returns:
+            list: All matching records.
+        """
+        statement = select(self.table)
+        for field, value in filters.items():
+            statement = statement.where(getattr(self.table, field) == self._coerce(field, value))
+        with self._session() as session:
+            return [row.model_dump(mode='json') for row in session.exec(statement)]
+
+    def iter_batches(self, batch_size=500, start=None, end=None, **filters):
+        """
+        Iterate over the records in batches, each fetched by its own keyset query on the
+        primary key so no session or cursor stays open between batches.
+
+        Yields:
+            list: The next batch of matching records.
+        """
+        statement = select(self.table).order_by(self.table.id).limit(batch_size)
+        for field, value in filters.items():
+            statement = statement.where(getattr(self.table, field) == self._coerce(field, value))
+        if start is not None:
+            statement = statement.where(self.table.end_datetime > start)
+        if end is not None:
+            statement = statement.where(self.table.start_datetime < end)
+        last = None
+        while True:
+            with Session(engine) as session:
+                page = statement if last is None else statement.where(self.table.id > last)
+                rows = session.exec(page).all()
+                last = rows[-1].id if rows else None
+                batch = [row.model_dump(mode='json') for row in rows]
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+
+    @timed
+    def retrieve(self, pk: uuid.UUID):
+        """
+        Retrieve a single record by its primary key.
+
+        Returns:
+            dict or None: The matching record or None if not found.
+        """
+        with self._session() as session:
+            row = session.get(self.table, self._coerce("id", pk))
+            return row.model_dump(mode='json') if row is not None else None
+
+    @timed
+    def create(self, **kwargs):
+        """
+        Create a new record with the given keyword arguments.
+
+        Returns:
+            dict: The newly created record with a UUID.
+        """
+        kwargs["id"] = str(uuid.uuid4())
+        with self._session() as session:
+            row = self.table.model_validate(kwargs)
+            session.add(row)
+            self._commit(session)
+            session.refresh(row)
+            return row.model_dump(mode='json')
+
+    @timed
+    def update(self, pk: uuid.UUID, **kwargs):
+        """
+        Update an existing record with new field values.
+
+        Returns:
+            dict or None: The updated record, or None if not found.
+        """
+        with self._session() as session:
+            row = session.get(self.table, self._coerce("id", pk))
+            if row is None:
+                return None
+            row.sqlmodel_update(self.table.model_validate({**row.model_dump(), **kwargs}).model_dump())
+            session.add(row)
+            self._commit(session)
+            session.refresh(row)
+            return row.model_dump(mode='json')
+
+    @timed
+    def bulk_create(self, records):
+        """
+        Create many records in a single transaction.
+
+        Returns:
+            list: The newly created records with their UUIDs.
+        """
+        with self._session() as session:
+            rows = [self.table.model_validate({**record, "id": str(uuid.uuid4())}) for record in records]
+            session.add_all(rows)
+            # Dump before committing, as the commit expires every row
+            created = [row.model_dump(mode='json') for row in rows]
+            self._commit(session)
+        return created
+
+    @timed
+    def bulk_update(self, updates):
+        """
+        Update many records in a single transaction.
+
+        Returns:
+            list: The updated record, or None if not found, for each (pk, fields) pair.
+        """
+        updated = []
+        with self._session() as session:
+            for pk, fields in updates:
+                row = session.get(self.table, self._coerce("id", pk))
+                if row is not None:
+                    row.sqlmodel_update(self.table.model_validate({**row.model_dump(), **fields}).model_dump())
+                    session.add(row)
+                updated.append(row)
+            updated = [row.model_dump(mode='json') if row is not None else None for row in updated]
+            self._commit(session)
+        return updated
+
+    @timed
+    def bulk_delete(self, pks):
+        """
+        Delete many records in a single transaction.
+
+        Returns:
+            list: True if the record was deleted, False otherwise, for each pk.
+        """
+        deleted = []
+        with self._session() as session:
+            for pk in pks:
+                row = session.get(self.table, self._coerce("id", pk))
+                if row is not None:
+                    session.delete(row)
+                    session.flush()
+                deleted.append(row is not None)
+            self._commit(session)
+        return deleted
+
+    @timed
+    def overlapping(self, start, end, room_id=None):
+        """
+        Retrieve records whose ``start_datetime``/``end_datetime`` range overlaps
+        [start, end), using the (room_id, start_datetime, end_datetime) index.
+
+        Returns:
+            list: The overlapping records.
+        """
+        statement = select(self.table).where(self.table.start_datetime < end, self.table.end_datetime > start)
+        if room_id is not None:
+            statement = statement.where(self.table.room_id == self._coerce("room_id", room_id))
+        with self._session() as session:
+            return [row.model_dump(mode='json') for row in session.exec(statement)]
+
+    @timed
+    def delete(self, pk: uuid.UUID) -> object:
+        """
+        Delete a record by its primary key.
+
+        Returns:
+            bool: True if a record was deleted, False otherwise.
+        """
+        with self._session() as session:
+            row = session.get(self.table, self._coerce("id", pk))
+            if row is None:
+                return False
+            session.delete(row)
+            self._commit(session)
+            return True
+
+
+class AsyncSQLDataBase:
+    """
+    Async counterpart of SQLDataBase. Every query runs in the event loop's default
+    executor, like the writes of AsyncDummyDataBase.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._db = SQLDataBase(model)
+
+    async def database(self):
+        """
+        Returns:
+            SQLDataBase: The synchronous interface over the same tables.
+        """
+        return self._db
+
+    async def run_sync(self, func, *args, **kwargs):
+        """ Run ``func(db, *args, **kwargs)`` in the executor with the synchronous interface. """
+        return await to_thread(func, self._db, *args, **kwargs)
+
+    async def retrieve_all(self, **filters):
+        """ Async version of SQLDataBase.retrieve_all. """
+        return await to_thread(self._db.retrieve_all, **filters)
+
+    async def iter_batches(self, batch_size=500, start=None, end=None, **filters):
+        """ Async version of SQLDataBase.iter_batches, fetching each batch in the executor. """
+        batches = self._db.iter_batches(batch_size, start, end, **filters)
+        while (batch := await to_thread(next, batches, None)) is not None:
+            yield batch
+
+    async def retrieve(self, pk: uuid.UUID):
+        """ Async version of SQLDataBase.retrieve. """
+        return await to_thread(self._db.retrieve, pk)
+
+    async def overlapping(self, start, end, room_id=None):
+        """ Async version of SQLDataBase.overlapping. """
+        return await to_thread(self._db.overlapping, start, end, room_id)
+
+    async def create(self, **kwargs):
+        """ Async version of SQLDataBase.create. """
+        return await to_thread(lambda: self._db.create(**kwargs))
+
+    async def update(self, pk: uuid.UUID, **kwargs):
+        """ Async version of SQLDataBase.update. """
+        return await to_thread(lambda: self._db.update(pk, **kwargs))
+
+    async def delete(self, pk: uuid.UUID) -> object:
+        """ Async version of SQLDataBase.delete. """
+        return await to_thread(self._db.delete, pk)
+
+    async def bulk_create(self, records):
+        """ Async version of SQLDataBase.bulk_create. """
+        return await to_thread(self._db.bulk_create, records)
+
+    async def bulk_update(self, updates):
+        """ Async version of SQLDataBase.bulk_update. """
+        return await to_thread(self._db.bulk_update, updates)
+
+    async def bulk_delete(self, pks):
+        """ Async version of SQLDataBase.bulk_delete. """
+        return await to_thread(self._db.bulk_delete, pks)
+
+
+def get_database(model):
+    """ Return the synchronous database for ``model`` on the configured storage backend. """
+    if get_settings().storage_backend == "sql":
+        return SQLDataBase(model)
+    return DummyDataBase(model)
+
+
+def get_async_database(model):
+    """ Return the async database for ``model`` on the configured storage backend. """
+    if get_settings().storage_backend == "sql":
+        return AsyncSQLDataBase(model)
+    return AsyncDummyDataBase(model)
 
 
 if __name__ == '__main__':
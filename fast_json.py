@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+import pydantic_core
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+
+from configs import get_settings
+
+
+def fast_json_enabled():
+    """ Whether list endpoints should build their JSON response themselves (`fast_json_responses`). """
+    return get_settings().fast_json_responses
+
+
+@lru_cache
+def type_adapter(tp):
+    """ Compile the validator and serializer of `tp` once, instead of on every request. """
+    return TypeAdapter(tp)
+
+
+def trusted_json_response(data):
+    """
+        Serialize data straight to JSON, without validating it against the response model.
+        Only for data already in its response shape, like the JSON-ready records of our stores.
+    """
+    return Response(content=pydantic_core.to_json(data), media_type="application/json")
+
+
+def validated_json_response(data, tp):
+    """
+        Validate data (ORM objects included) as `tp` and serialize it in one pass of the
+        compiled serializer, skipping FastAPI's jsonable_encoder and stdlib json round trip.
+    """
+    adapter = type_adapter(tp)
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(data, from_attributes=True)),
+        media_type="application/json",
+    )
+
+
+async def _ndjson_chunks(batches):
+    async for batch in batches:
+        yield b"".join(pydantic_core.to_json(record) + b"\n" for record in batch)
+
+
+def ndjson_response(batches):
+    """
+        Stream an async iterator of record batches as newline-delimited JSON, one chunk
+        per batch, so only a single batch is ever held in memory.
+    """
+    return StreamingResponse(_ndjson_chunks(batches), media_type="application/x-ndjson")
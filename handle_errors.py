@@ -1,22 +1,165 @@
-import os
+import atexit
+import logging
+import queue
+import threading
+import time
 import traceback
+from dataclasses import dataclass
 from datetime import datetime
+from logging.handlers import QueueListener, RotatingFileHandler
 
 from fastapi import FastAPI
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
+from configs import get_settings
+
+
+@dataclass
+class ErrorStats:
+    """ How often an error with a given traceback occurred. """
+    message: str
+    count: int
+    first_seen: float
+    last_seen: float
+    last_logged: float = 0.0
+
+
+def fingerprint(exc: BaseException):
+    """ Identify a traceback by its exception type and the code locations it went through. """
+    frames = tuple((frame.f_code.co_filename, lineno) for frame, lineno in traceback.walk_tb(exc.__traceback__))
+    return type(exc).__qualname__, frames
+
+
+class ErrorLog:
+    """
+    Error logger that never blocks the request reporting an error.
+
+    ``report`` only updates counters and, when an entry is due, puts it on a bounded
+    queue; a QueueListener thread writes the entries to a RotatingFileHandler, so the
+    file never grows beyond ``backup_count + 1`` files of ``max_bytes``.
+
+    Identical tracebacks are deduplicated: the first occurrence is logged in full,
+    repeats only update the count and last-seen time of its ErrorStats, and at most
+    every ``repeat_interval`` seconds a one-line summary of them is logged. If the
+    first occurrence is skipped by the rate limit (or the queue is full), the next
+    one to be logged carries the traceback instead. Entries are also rate limited to
+    ``rate`` per second (a token bucket of ``burst`` entries) so an error storm costs
+    a dictionary update per request and nothing more.
+
+    Attributes:
+        stats (dict): ErrorStats of each fingerprint, oldest first, for at most ``max_errors`` errors.
+        suppressed (int): Entries skipped by the rate limit since one was last logged.
+        dropped (int): Entries lost because the queue was full.
+    """
+
+    def __init__(self, path="errors.txt", max_bytes=1024 * 1024, backup_count=5, rate=10.0, burst=20,
+                 repeat_interval=60.0, max_queue=1000, max_errors=1000):
+        self.rate = rate
+        self.burst = burst
+        self.repeat_interval = repeat_interval
+        self.max_errors = max_errors
+        self.stats = {}
+        self.suppressed = 0
+        self.dropped = 0
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(max_queue)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = QueueListener(self._queue, handler)
+        self._started = False
+
+    def start(self):
+        """ Start the writer thread, which is stopped (after writing what is queued) on exit. """
+        if not self._started:
+            self._started = True
+            self._listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        if self._started:
+            self._started = False
+            self._listener.stop()
+
+    def report(self, exc: BaseException):
+        """ Count ``exc`` and queue a log entry for it, unless it is a recent repeat or over the rate limit. """
+        key = fingerprint(exc)
+        now = time.time()
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = ErrorStats(str(exc), 0, now, now)
+                if len(self.stats) > self.max_errors:
+                    del self.stats[next(iter(self.stats))]
+            stats.count += 1
+            stats.last_seen = now
+            # Until an entry with its traceback was written, every occurrence may carry it
+            full = not stats.last_logged
+            if not full and now - stats.last_logged < self.repeat_interval:
+                return
+            if not self._take_token():
+                self.suppressed += 1
+                return
+            stats.last_logged = now
+            suppressed, self.suppressed = self.suppressed, 0
+            count, first_seen = stats.count, stats.first_seen
+
+        if full:
+            entry = (
+                f"Time: {datetime.fromtimestamp(now)}\n"
+                f"Error Message: {exc}\n"
+                f"Error Traceback: {''.join(traceback.format_exception(exc))}\n"
+            )
+            if count > 1:
+                entry += f"Repeated: {count} times since {datetime.fromtimestamp(first_seen)}\n"
+        else:
+            entry = (
+                f"Time: {datetime.fromtimestamp(now)}\n"
+                f"Error Message: {exc}\n"
+                f"Repeated: {count} times since {datetime.fromtimestamp(first_seen)}\n"
+            )
+        if suppressed:
+            entry += f"Rate limited: {suppressed} entries skipped\n"
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": entry}))
+        except queue.Full:
+            self.dropped += 1
+            if full:
+                with self._lock:
+                    stats.last_logged = 0.0  # Log the traceback with the next occurrence instead
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def build_error_log(settings):
+    """ Build the ErrorLog configured by the ``error_log_*`` settings. """
+    return ErrorLog(
+        path=settings.error_log_path,
+        max_bytes=settings.error_log_max_bytes,
+        backup_count=settings.error_log_backup_count,
+        rate=settings.error_log_rate,
+        repeat_interval=settings.error_log_repeat_interval,
+    )
+
+
+def register_global_error_handler(app: FastAPI, error_log: ErrorLog | None = None):
+    error_log = error_log or build_error_log(get_settings())
+    error_log.start()
+    app.state.error_log = error_log
 
-def register_global_error_handler(app: FastAPI):
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
         try:
-            with open(os.path.join(f"errors.txt"), 'a') as f:
-                f.write(
-                    f"Time: {datetime.now()}\n"
-                    f"Error Message: {exc}\n"
-                    f"Error Traceback: {traceback.format_exc()}\n\n"
-                )
+            error_log.report(exc)
         except Exception as e:
             print(f"Error while logging errors: {e}")
         return JSONResponse(status_code=500, content={"detail": "Internal server error"})
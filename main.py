@@ -1,42 +1,92 @@
-import time
-from functools import lru_cache
+from startup import startup_timer  # First, so that the imports below are timed
+
+import asyncio
+import logging
 from typing import Annotated
 
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect, Body, Depends, Query, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
-from sqlmodel import Session, select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from configs import Settings
+from assets import AssetFiles, asset, static_directory
+from cache import LRUCache, ResponseCacheMiddleware
+from chat import DEFAULT_CHANNEL, ConnectionManager
+from configs import Settings, get_settings
+from fast_json import fast_json_enabled, validated_json_response
 from handle_errors import register_global_error_handler
-from models import Tags, create_db_and_tables, Hero, engine, HeroCreate, HeroUpdate, TeamCreate, Team, TeamUpdate, \
-    HeroPublicWithTeam, TeamPublicWithHero
-from routes import rooms, bookings
+from metrics import REGISTRY, CallbackMetric, MetricsMiddleware
+from models import Tags, ensure_schema, schema_created, Hero, get_async_engine, HeroCreate, HeroUpdate, \
+    TeamCreate, Team, TeamUpdate, HeroPublicWithTeam, TeamPublicWithHero, BulkItemResult, HeroBulkUpdate, TeamBulkUpdate
+from pagination import paginate, set_next_cursor
+from profiler import ProfilingMiddleware
+from pubsub import get_pubsub
+from routes import admin, rooms, bookings
+
+startup_timer.mark("imports")
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     print('Application Started', time.perf_counter())
-#     yield
-#     print('Application Stopped', time.perf_counter())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables are created on first use (or by `python migrate.py`) unless asked for here
+    if get_settings().create_schema_on_startup:
+        await asyncio.to_thread(ensure_schema)
+    startup_timer.mark("lifespan startup")
+    report = startup_timer.report()
+    logging.getLogger("uvicorn.error").info("Startup took %s ms: %s", report["total_ms"], report["steps_ms"])
+    yield
+    await manager.close()
 
 
 # Create the FastAPI app instance
-app = FastAPI()
-# app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan)
 
-# Static Files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static Files, precompressed and content-hashed once built with `python assets.py`
+app.mount("/static", AssetFiles(directory=static_directory()), name="static")
 
 # Register routers with prefixes for route grouping
 app.include_router(rooms.router, prefix='/rooms')
 app.include_router(bookings.router, prefix='/bookings')
+app.include_router(admin.router, prefix='/admin')
 
 # Register a global error handler for the entire app
 register_global_error_handler(app)
 
+# Hand requests over to the sampling profiler once it is started from /admin/profiler
+app.add_middleware(ProfilingMiddleware)
+
+# Time every request reaching the routes (answers served from the response cache are counted by it)
+if get_settings().metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Cache read-heavy listings; writes under the same prefix drop the entries built from that data
+response_cache = LRUCache(maxsize=get_settings().response_cache_size, ttl=get_settings().response_cache_ttl)
+CallbackMetric(
+    "response_cache_lookups_total", "Lookups of the response cache, by result.",
+    lambda: [(("hit",), response_cache.hits), (("miss",), response_cache.misses)],
+    kind="counter", labelnames=("result",),
+)
+app.add_middleware(
+    ResponseCacheMiddleware,
+    backend=response_cache,
+    cached_routes=[
+        (r"/rooms/", {"rooms"}),
+        (r"/rooms/[0-9a-fA-F-]{36}", {"rooms"}),
+        (r"/teams/", {"teams", "heroes"}),  # Teams embed their heroes
+        (r"/heroes/\d+", {"heroes", "teams"}),  # Heroes embed their team
+        (r"/chat", {"pages"}),  # Rendered without request data
+    ],
+    invalidations=[
+        (r"/rooms/", {"rooms"}),
+        (r"/teams/", {"teams"}),
+        (r"/heroes/", {"heroes"}),
+    ],
+)
+
 
 # Basic welcome message
 @app.get("/", tags=[Tags.root])
@@ -44,19 +94,30 @@ def read_root():
     return {"Hello": "World"}
 
 
-templates = Jinja2Templates(directory="templates")
+@lru_cache
+def get_templates():
+    """
+    Jinja2 is imported and set up when a page is first rendered, not at startup.
+    Compiled templates are kept in the system temp directory, so that workers and
+    restarts load them instead of compiling them again.
+    """
+    from fastapi.templating import Jinja2Templates
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    env = Environment(loader=FileSystemLoader("templates"), autoescape=True, bytecode_cache=FileSystemBytecodeCache())
+    env.globals["asset"] = asset
+    return Jinja2Templates(env=env)
 
 
 @app.get('/home/{pk}', response_class=HTMLResponse)
 def read_template(request: Request, pk: str):
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         request=request, name="home.html", context={"id": pk}
     )
 
 
 @app.get('/chat', response_class=HTMLResponse)
 def read_template(request: Request):
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         request=request, name="chat.html"
     )
 
@@ -69,45 +130,25 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.send_text(f"Message: {data}")
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str, websocket: WebSocket):
-        for connection in self.active_connections:
-            if not connection == websocket:
-                await connection.send_text(message)
-
-
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_queue=get_settings().chat_send_queue_size,
+    slow_consumer_policy=get_settings().chat_slow_consumer_policy,
+    pubsub=get_pubsub(get_settings()),
+    history_size=get_settings().chat_history_size,
+)
 
 
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, client_id: int, channel: str = DEFAULT_CHANNEL):
+    await manager.connect(websocket, channel)
     try:
         while True:
             data = await websocket.receive_text()
             await manager.send_personal_message(f"You wrote: {data}", websocket)
-            await manager.broadcast(f"Client #{client_id} says: {data}", websocket)
+            await manager.broadcast(f"Client #{client_id} says: {data}", websocket, channel)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
-        await manager.broadcast(f"Client #{client_id} left the chat", websocket)
-
-
-@lru_cache
-def get_settings():
-    return Settings()
+        await manager.broadcast(f"Client #{client_id} left the chat", websocket, channel)
 
 
 @app.get("/env_data")
@@ -119,122 +160,249 @@ async def info(settings: Annotated[Settings, Depends(get_settings)]):
     }
 
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """ Request, storage, SQL and thread pool metrics in the Prometheus text format. """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+async def get_async_session():
+    if not schema_created():
+        await asyncio.to_thread(ensure_schema)
+    # Keep loaded attributes after commit, an async session can't lazily refresh them
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
 
 
 @app.post("/heroes/", response_model=HeroPublicWithTeam)
-def create_hero(*, session: Session = Depends(get_session), hero: HeroCreate):
+async def create_hero(*, session: AsyncSession = Depends(get_async_session), hero: HeroCreate):
     db_hero = Hero.model_validate(hero)
     session.add(db_hero)
-    session.commit()
-    session.refresh(db_hero)
-    return db_hero
+    await session.commit()
+    # Relationships can't be lazy-loaded on an async session: reload with the team joined
+    return await session.get(Hero, db_hero.id, options=[joinedload(Hero.team)], populate_existing=True)
 
 
 @app.get("/heroes/", response_model=list[HeroPublicWithTeam])
-def read_heroes(
+async def read_heroes(
         *,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
+        response: Response,
+        cursor: str | None = None,
         offset: int = 0,
         limit: int = Query(default=100, le=100),
 ):
-    heroes = session.exec(select(Hero).offset(offset).limit(limit)).all()
+    # Each hero has at most one team: join it into the same query
+    statement = select(Hero).options(joinedload(Hero.team))
+    heroes = (await session.exec(paginate(statement, Hero.id, cursor, offset, limit))).all()
+    if fast_json_enabled():
+        response = validated_json_response(heroes, list[HeroPublicWithTeam])
+        set_next_cursor(response, heroes, limit)
+        return response
+    set_next_cursor(response, heroes, limit)
     return heroes
 
 
+async def _missing_team_ids(session, team_ids):
+    """ Return which of `team_ids` don't exist, with a single query. """
+    team_ids = {team_id for team_id in team_ids if team_id is not None}
+    if not team_ids:
+        return set()
+    existing = (await session.exec(select(Team.id).where(Team.id.in_(team_ids)))).all()
+    return team_ids - set(existing)
+
+
+@app.post("/heroes/bulk", response_model=list[BulkItemResult])
+async def create_heroes(*, session: AsyncSession = Depends(get_async_session), heroes: list[HeroCreate]):
+    missing_teams = await _missing_team_ids(session, (hero.team_id for hero in heroes))
+    results = [None] * len(heroes)
+    created = []
+    for index, hero in enumerate(heroes):
+        if hero.team_id in missing_teams:
+            results[index] = BulkItemResult(index=index, ok=False, detail="Team not found")
+            continue
+        db_hero = Hero.model_validate(hero)
+        session.add(db_hero)
+        created.append((index, db_hero))
+    await session.commit()
+    for index, db_hero in created:
+        results[index] = BulkItemResult(index=index, ok=True, id=db_hero.id)
+    return results
+
+
+@app.patch("/heroes/bulk", response_model=list[BulkItemResult])
+async def update_heroes(*, session: AsyncSession = Depends(get_async_session), heroes: list[HeroBulkUpdate]):
+    db_heroes = {
+        hero.id: hero
+        for hero in (await session.exec(select(Hero).where(Hero.id.in_({hero.id for hero in heroes})))).all()
+    }
+    missing_teams = await _missing_team_ids(session, (hero.team_id for hero in heroes))
+    results = []
+    for index, hero in enumerate(heroes):
+        hero_data = hero.model_dump(exclude_unset=True, exclude={"id"})
+        if hero.id not in db_heroes:
+            results.append(BulkItemResult(index=index, ok=False, id=hero.id, detail="Hero not found"))
+        elif hero_data.get("team_id") in missing_teams:
+            results.append(BulkItemResult(index=index, ok=False, id=hero.id, detail="Team not found"))
+        else:
+            db_heroes[hero.id].sqlmodel_update(hero_data)
+            session.add(db_heroes[hero.id])
+            results.append(BulkItemResult(index=index, ok=True, id=hero.id))
+    await session.commit()
+    return results
+
+
+@app.delete("/heroes/bulk", response_model=list[BulkItemResult])
+async def delete_heroes(*, session: AsyncSession = Depends(get_async_session), hero_ids: Annotated[list[int], Body()]):
+    db_heroes = {hero.id: hero for hero in (await session.exec(select(Hero).where(Hero.id.in_(set(hero_ids))))).all()}
+    results = []
+    for index, hero_id in enumerate(hero_ids):
+        hero = db_heroes.pop(hero_id, None)
+        if hero is None:
+            results.append(BulkItemResult(index=index, ok=False, id=hero_id, detail="Hero not found"))
+            continue
+        await session.delete(hero)
+        results.append(BulkItemResult(index=index, ok=True, id=hero_id))
+    await session.commit()
+    return results
+
+
 @app.get("/heroes/{hero_id}", response_model=HeroPublicWithTeam)
-def read_hero(*, session: Session = Depends(get_session), hero_id: int):
-    hero = session.get(Hero, hero_id)
+async def read_hero(*, session: AsyncSession = Depends(get_async_session), hero_id: int):
+    hero = await session.get(Hero, hero_id, options=[joinedload(Hero.team)])
     if not hero:
         raise HTTPException(status_code=404, detail="Hero not found")
     return hero
 
 
 @app.patch("/heroes/{hero_id}", response_model=HeroPublicWithTeam)
-def update_hero(
-        *, session: Session = Depends(get_session), hero_id: int, hero: HeroUpdate
+async def update_hero(
+        *, session: AsyncSession = Depends(get_async_session), hero_id: int, hero: HeroUpdate
 ):
-    db_hero = session.get(Hero, hero_id)
+    db_hero = await session.get(Hero, hero_id)
     if not db_hero:
         raise HTTPException(status_code=404, detail="Hero not found")
     hero_data = hero.model_dump(exclude_unset=True)
     db_hero.sqlmodel_update(hero_data)
     session.add(db_hero)
-    session.commit()
-    session.refresh(db_hero)
-    return db_hero
+    await session.commit()
+    return await session.get(Hero, hero_id, options=[joinedload(Hero.team)], populate_existing=True)
 
 
 @app.delete("/heroes/{hero_id}")
-def delete_hero(*, session: Session = Depends(get_session), hero_id: int):
-    hero = session.get(Hero, hero_id)
+async def delete_hero(*, session: AsyncSession = Depends(get_async_session), hero_id: int):
+    hero = await session.get(Hero, hero_id)
     if not hero:
         raise HTTPException(status_code=404, detail="Hero not found")
-    session.delete(hero)
-    session.commit()
+    await session.delete(hero)
+    await session.commit()
     return {"ok": True}
 
 
 # Code above omitted 👆
 
 @app.post("/teams/", response_model=TeamPublicWithHero)
-def create_team(*, session: Session = Depends(get_session), team: TeamCreate):
+async def create_team(*, session: AsyncSession = Depends(get_async_session), team: TeamCreate):
     db_team = Team.model_validate(team)
     session.add(db_team)
-    session.commit()
-    session.refresh(db_team)
-    return db_team
+    await session.commit()
+    return await session.get(Team, db_team.id, options=[selectinload(Team.heroes)], populate_existing=True)
 
 
 @app.get("/teams/", response_model=list[TeamPublicWithHero])
-def read_teams(
+async def read_teams(
         *,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
+        response: Response,
+        cursor: str | None = None,
         offset: int = 0,
         limit: int = Query(default=100, le=100),
 ):
-    teams = session.exec(select(Team).offset(offset).limit(limit)).all()
+    # Load the heroes of the whole page with one extra IN query instead of one per team
+    statement = select(Team).options(selectinload(Team.heroes))
+    teams = (await session.exec(paginate(statement, Team.id, cursor, offset, limit))).all()
+    if fast_json_enabled():
+        response = validated_json_response(teams, list[TeamPublicWithHero])
+        set_next_cursor(response, teams, limit)
+        return response
+    set_next_cursor(response, teams, limit)
     return teams
 
 
+@app.post("/teams/bulk", response_model=list[BulkItemResult])
+async def create_teams(*, session: AsyncSession = Depends(get_async_session), teams: list[TeamCreate]):
+    db_teams = [Team.model_validate(team) for team in teams]
+    session.add_all(db_teams)
+    await session.commit()
+    return [BulkItemResult(index=index, ok=True, id=db_team.id) for index, db_team in enumerate(db_teams)]
+
+
+@app.patch("/teams/bulk", response_model=list[BulkItemResult])
+async def update_teams(*, session: AsyncSession = Depends(get_async_session), teams: list[TeamBulkUpdate]):
+    db_teams = {
+        team.id: team
+        for team in (await session.exec(select(Team).where(Team.id.in_({team.id for team in teams})))).all()
+    }
+    results = []
+    for index, team in enumerate(teams):
+        if team.id not in db_teams:
+            results.append(BulkItemResult(index=index, ok=False, id=team.id, detail="Team not found"))
+            continue
+        db_teams[team.id].sqlmodel_update(team.model_dump(exclude_unset=True, exclude={"id"}))
+        session.add(db_teams[team.id])
+        results.append(BulkItemResult(index=index, ok=True, id=team.id))
+    await session.commit()
+    return results
+
+
+@app.delete("/teams/bulk", response_model=list[BulkItemResult])
+async def delete_teams(*, session: AsyncSession = Depends(get_async_session), team_ids: Annotated[list[int], Body()]):
+    db_teams = {team.id: team for team in (await session.exec(select(Team).where(Team.id.in_(set(team_ids))))).all()}
+    results = []
+    for index, team_id in enumerate(team_ids):
+        team = db_teams.pop(team_id, None)
+        if team is None:
+            results.append(BulkItemResult(index=index, ok=False, id=team_id, detail="Team not found"))
+            continue
+        await session.delete(team)
+        results.append(BulkItemResult(index=index, ok=True, id=team_id))
+    await session.commit()
+    return results
+
+
 @app.get("/teams/{team_id}", response_model=TeamPublicWithHero)
-def read_team(*, team_id: int, session: Session = Depends(get_session)):
-    team = session.get(Team, team_id)
+async def read_team(*, team_id: int, session: AsyncSession = Depends(get_async_session)):
+    team = await session.get(Team, team_id, options=[selectinload(Team.heroes)])
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
     return team
 
 
 @app.patch("/teams/{team_id}", response_model=TeamPublicWithHero)
-def update_team(
+async def update_team(
         *,
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
         team_id: int,
         team: TeamUpdate,
 ):
-    db_team = session.get(Team, team_id)
+    db_team = await session.get(Team, team_id)
     if not db_team:
         raise HTTPException(status_code=404, detail="Team not found")
     team_data = team.model_dump(exclude_unset=True)
     db_team.sqlmodel_update(team_data)
     session.add(db_team)
-    session.commit()
-    session.refresh(db_team)
-    return db_team
+    await session.commit()
+    return await session.get(Team, team_id, options=[selectinload(Team.heroes)], populate_existing=True)
 
 
 @app.delete("/teams/{team_id}")
-def delete_team(*, session: Session = Depends(get_session), team_id: int):
-    team = session.get(Team, team_id)
+async def delete_team(*, session: AsyncSession = Depends(get_async_session), team_id: int):
+    team = await session.get(Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    session.delete(team)
-    session.commit()
+    await session.delete(team)
+    await session.commit()
     return {"ok": True}
+
+
+startup_timer.mark("app setup")
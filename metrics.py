@@ -0,0 +1,266 @@
+import asyncio
+import functools
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from sqlalchemy import event
+
+from profiler import profiler
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """ The metrics rendered by the /metrics endpoint. """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """ Render every metric in the Prometheus text exposition format. """
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+class _PerThread:
+    """
+    Base of metrics recorded without locks: each thread only writes to its own shard
+    (a dict of series by label values), and rendering adds the shards up.
+    """
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _series(self):
+        """ Label values and series of every shard, read without stopping the writers. """
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+
+class Counter(_PerThread):
+    """ A value that only goes up, such as a number of events. """
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def render(self):
+        totals = {}
+        for labelvalues, value in self._series():
+            totals[labelvalues] = totals.get(labelvalues, 0) + value
+        lines = [f"# HELP {self.name} {self.help}\n", f"# TYPE {self.name} counter\n"]
+        lines += [
+            f"{self.name}{_labels(self.labelnames, labelvalues)} {value}\n" for labelvalues, value in totals.items()
+        ]
+        return "".join(lines)
+
+
+class Histogram(_PerThread):
+    """
+    Distribution of observed values (such as durations) over fixed buckets.
+
+    A series is a list holding the count of each bucket, then of values above the
+    last bucket, then the sum of all values; observing is one bisection and two
+    additions on the calling thread's shard.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        shard = self._shard()
+        series = shard.get(labelvalues)
+        if series is None:
+            series = shard[labelvalues] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        totals = {}
+        for labelvalues, series in self._series():
+            total = totals.setdefault(labelvalues, [0] * (len(self.buckets) + 2))
+            for position, value in enumerate(series):
+                total[position] += value
+        lines = [f"# HELP {self.name} {self.help}\n", f"# TYPE {self.name} histogram\n"]
+        for labelvalues, series in totals.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}\n")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {series[-1]}\n")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}\n")
+        return "".join(lines)
+
+
+class CallbackMetric:
+    """ Gauge or counter whose samples are read from ``collect()`` when rendered, as (label values, value) pairs. """
+
+    def __init__(self, name, help, collect, kind="gauge", labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}\n", f"# TYPE {self.name} {self.kind}\n"]
+        lines += [
+            f"{self.name}{_labels(self.labelnames, labelvalues)} {value}\n" for labelvalues, value in self.collect()
+        ]
+        return "".join(lines)
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, by route template.",
+    ("method", "route", "status"),
+)
+storage_operation_duration = Histogram(
+    "storage_operation_duration_seconds", "Time spent in room and booking storage calls.",
+    ("store", "model", "operation"),
+)
+sql_query_duration = Histogram(
+    "sql_query_duration_seconds", "Time to execute a SQL statement, by statement type.", ("engine", "statement"),
+)
+threadpool_queue_wait = Histogram(
+    "threadpool_queue_wait_seconds", "Time work waited for a worker thread of the event loop's executor.", ("pool",),
+)
+
+
+def _anyio_limiter():
+    # Threads running sync endpoints and dependencies; only readable from the event loop
+    from anyio.to_thread import current_default_thread_limiter
+    try:
+        limiter = current_default_thread_limiter()
+    except RuntimeError:
+        return []
+    return [
+        (("total",), limiter.total_tokens),
+        (("busy",), limiter.borrowed_tokens),
+        (("waiting",), limiter.statistics().tasks_waiting),
+    ]
+
+
+CallbackMetric(
+    "anyio_threadpool_threads", "Threads of the anyio pool running sync endpoints.", _anyio_limiter,
+    labelnames=("state",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request, labelled with the
+    route template matched by FastAPI (e.g. ``/rooms/{room_id}``) so ids don't
+    multiply the series; requests matching no route are labelled ``unmatched``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                perf_counter() - start, scope["method"], route.path if route is not None else "unmatched", status,
+            )
+
+
+def timed(method):
+    """ Record the duration of a storage method, labelled with its class, model and name. """
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            storage_operation_duration.observe(perf_counter() - start, type(self).__name__, self.model, operation)
+
+    return wrapper
+
+
+async def to_thread(func, /, *args, **kwargs):
+    """
+    asyncio.to_thread, recording how long ``func`` waited for a free worker thread, and
+    crediting its stacks to the request calling it if the profiler samples that request.
+    """
+    submitted = perf_counter()
+
+    def run():
+        threadpool_queue_wait.observe(perf_counter() - submitted, "asyncio")
+        with profiler.worker():
+            return func(*args, **kwargs)
+
+    return await asyncio.to_thread(run)
+
+
+def instrument_engine(engine, name="sync"):
+    """ Record the count and duration of the SQL statements run by ``engine`` (a sync Engine). """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["query_start"].pop()
+        sql_query_duration.observe(elapsed, name, statement.lstrip().split(None, 1)[0].upper())
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
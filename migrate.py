@@ -0,0 +1,32 @@
+"""
+One-shot import of the JSON "database" into the SQL tables.
+
+Run it once before switching `storage_backend` to "sql"; it also creates the tables:
+
+    python migrate.py
+
+Rooms are imported before bookings. Records already present (same id) are
+overwritten, so running it again is safe.
+"""
+from sqlmodel import Session
+
+from data import DummyDataBase
+from models import BookingTable, RoomTable, engine, ensure_schema
+
+
+def migrate():
+    ensure_schema()
+    counts = {}
+    with Session(engine) as session:
+        for model, table in (("rooms", RoomTable), ("bookings", BookingTable)):
+            records = DummyDataBase(model=model).retrieve_all()
+            for record in records:
+                session.merge(table.model_validate(record))
+            counts[model] = len(records)
+        session.commit()
+    return counts
+
+
+if __name__ == '__main__':
+    for model, count in migrate().items():
+        print(f"Imported {count} {model}")
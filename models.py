@@ -1,15 +1,23 @@
-from datetime import datetime, timedelta
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from enum import Enum
 from uuid import UUID
 
-from pydantic import BaseModel, Field
-from sqlmodel import Field as SQLField, SQLModel, create_engine, Relationship
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import DateTime, TypeDecorator, event, make_url
+from sqlmodel import Field as SQLField, Index, SQLModel, create_engine, Relationship
+
+from configs import get_settings
+from metrics import instrument_engine
 
 
 class Tags(str, Enum):
     rooms = 'Rooms'
     bookings = 'Bookings'
     root = 'Root'
+    admin = 'Admin'
 
 
 class RoomType(str, Enum):
@@ -29,6 +37,38 @@ class Room(RoomBaseModel):
     id: UUID
 
 
+class RoomBulkUpdateModel(RoomBaseModel):
+    id: UUID
+
+
+def calculate_nights(start_datetime, end_datetime):
+    """
+        Count the 12:00-to-12:00 periods touched between start_datetime and end_datetime.
+        The first period starts at the last 12:00 not after start_datetime, so the count is
+        the number of whole or partial days from there to end_datetime, computed in O(1).
+    """
+    first_noon = start_datetime.replace(hour=12, minute=0, second=0, microsecond=0)
+    if start_datetime < first_noon:
+        first_noon -= timedelta(days=1)
+    if end_datetime <= first_noon:
+        return 0
+    return -((first_noon - end_datetime) // timedelta(days=1))  # Ceiling division
+
+
+def price_bookings(quotes, prices):
+    """
+        Price many stays at once, e.g. for quote screens or nightly re-pricing jobs.
+        `quotes` is an iterable of (room_id, start_datetime, end_datetime) tuples and
+        `prices` maps room_id to price_per_night.
+        Returns a list of (nights, total_price) tuples in the same order.
+    """
+    priced = []
+    for room_id, start_datetime, end_datetime in quotes:
+        nights = calculate_nights(start_datetime, end_datetime)
+        priced.append((nights, nights * prices[room_id]))
+    return priced
+
+
 class BookingDateTimeModel(BaseModel):
     """
         Assumptions:
@@ -47,28 +87,12 @@ class BookingDateTimeModel(BaseModel):
             Calculate number_of_nights of 12:00-to-12:00 periods
             between start_datetime and end_datetime to charge customer.
         """
-        count = 0
-        current = self.start_datetime.replace(hour=12, minute=0, second=0, microsecond=0)
+        return calculate_nights(self.start_datetime, self.end_datetime)
 
-        if self.start_datetime < current:
-            current -= timedelta(days=1)
 
-        while current < self.end_datetime:
-            count += 1
-            current += timedelta(days=1)
-
-        return count
-
-    def is_room_available(self, bookings):
-        """
-            Check if room is available between start_date and end_date.
-            `existing_bookings` should be a list of BookingBaseModel or dicts with start/end dates.
-        """
-        for data in bookings:
-            booking = BookingDateTimeModel(**data)
-            if not (self.end_datetime <= booking.start_datetime or self.start_datetime >= booking.end_datetime):
-                return False  # Overlapping booking found
-        return True
+class RoomAvailability(Room):
+    nights: int
+    total_price: float
 
 
 class BookingBaseModel(BookingDateTimeModel):
@@ -83,6 +107,85 @@ class Booking(BookingBaseModel):
     total_price: float = Field(gt=0)
 
 
+class BookingQuoteModel(BookingDateTimeModel):
+    model_config = {"extra": "forbid"}
+    room_id: UUID
+
+
+class BookingQuote(BookingQuoteModel):
+    nights: int
+    total_price: float
+
+
+class BulkItemResult(BaseModel):
+    """ Outcome of one item of a bulk request, `index` being its position in the request. """
+    index: int
+    ok: bool
+    id: UUID | int | None = None
+    detail: str | None = None
+
+
+class ProfilerSettings(BaseModel):
+    """ Which requests the sampling profiler samples: `path` is a regex, `header` a header name. """
+    model_config = {"extra": "forbid"}
+    path: str | None = None
+    header: str | None = None
+    rate: float = Field(default=1.0, gt=0, le=1)
+    interval: float | None = Field(default=None, gt=0)
+
+    @field_validator("path")
+    @classmethod
+    def check_path(cls, path):
+        if path is not None:
+            try:
+                re.compile(path)
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}")
+        return path
+
+
+class UTCDateTime(TypeDecorator):
+    """
+        DateTime column holding UTC. Datetimes with an offset are converted to UTC when written
+        or compared, so bookings made in different offsets compare by instant as on the JSON
+        backend; naive datetimes are taken as UTC. Values are read back as UTC datetimes.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
+class RoomTable(SQLModel, table=True):
+    """ SQL storage for rooms, used when `storage_backend` is "sql". """
+    __tablename__ = "room"
+    id: UUID = SQLField(primary_key=True)
+    room_type: RoomType = SQLField(index=True)
+    price_per_night: float
+    available: bool = False
+
+
+class BookingTable(SQLModel, table=True):
+    """ SQL storage for bookings, used when `storage_backend` is "sql". """
+    __tablename__ = "booking"
+    __table_args__ = (Index("ix_booking_room_id_start_end", "room_id", "start_datetime", "end_datetime"),)
+    id: UUID = SQLField(primary_key=True)
+    room_id: UUID = SQLField(index=True, foreign_key="room.id")
+    guest_name: str = SQLField(max_length=100)
+    start_datetime: datetime = SQLField(sa_type=UTCDateTime)
+    end_datetime: datetime = SQLField(sa_type=UTCDateTime)
+    nights: int
+    total_price: float
+
+
 # class Hero(SQLModel, table=True):
 #     id: int | None = SQLField(default=None, primary_key=True)
 #     name: str = SQLField(index=True)
@@ -113,6 +216,10 @@ class TeamUpdate(SQLModel):
     headquarters: str | None = None
 
 
+class TeamBulkUpdate(TeamUpdate):
+    id: int
+
+
 class HeroBase(SQLModel):
     name: str = SQLField(index=True)
     secret_name: str
@@ -142,6 +249,10 @@ class HeroUpdate(SQLModel):
     team_id: int | None = None
 
 
+class HeroBulkUpdate(HeroUpdate):
+    id: int
+
+
 class HeroPublicWithTeam(HeroPublic):
     team: TeamPublic | None = None
 
@@ -150,12 +261,98 @@ class TeamPublicWithHero(TeamPublic):
     heroes: list[HeroPublic] = []
 
 
-sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
-
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+def build_engine(settings):
+    """
+        Create the SQL engine from settings.
+        SQLite connections are switched to WAL so readers don't block the writer, with
+        synchronous=NORMAL (safe in WAL mode), memory-mapped reads and a larger page cache.
+    """
+    url = make_url(settings.database_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = {"echo": settings.database_echo}
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    if not (is_sqlite and url.database in (None, "", ":memory:")):
+        # In-memory SQLite uses a single-connection pool without these options
+        options["pool_size"] = settings.database_pool_size
+        options["max_overflow"] = settings.database_max_overflow
+    engine = create_engine(url, **options)
+    if is_sqlite:
+        _set_sqlite_pragmas_on_connect(engine, settings)
+    if settings.metrics_enabled:
+        instrument_engine(engine, "sync")
+    return engine
+
+
+def _set_sqlite_pragmas_on_connect(engine, settings):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.close()
+
+
+# Async drivers used for each database when `async_database_url` isn't set
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def build_async_engine(settings):
+    """
+        Create the async SQL engine from settings, on the same database as `build_engine`
+        unless `async_database_url` points elsewhere.
+    """
+    if settings.async_database_url:
+        url = make_url(settings.async_database_url)
+    else:
+        url = make_url(settings.database_url)
+        url = url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = {"echo": settings.database_echo}
+    if not (is_sqlite and url.database in (None, "", ":memory:")):
+        options["pool_size"] = settings.database_pool_size
+        options["max_overflow"] = settings.database_max_overflow
+    from sqlalchemy.ext.asyncio import create_async_engine
+    async_engine = create_async_engine(url, **options)
+    if is_sqlite:
+        _set_sqlite_pragmas_on_connect(async_engine.sync_engine, settings)
+    if settings.metrics_enabled:
+        instrument_engine(async_engine.sync_engine, "async")
+    return async_engine
+
+
+engine = build_engine(get_settings())
+
+
+@lru_cache
+def get_async_engine():
+    """ The async engine is built on first use, so the async driver is only needed when used. """
+    return build_async_engine(get_settings())
 
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+
+
+_schema_lock = threading.Lock()
+_schema_created = False
+
+
+def schema_created():
+    return _schema_created
+
+
+def ensure_schema():
+    """
+        Create the tables once per process, when the database is first used rather than at startup.
+        `python migrate.py` creates them ahead of time.
+    """
+    global _schema_created
+    if _schema_created:
+        return
+    with _schema_lock:
+        if not _schema_created:
+            create_db_and_tables()
+            _schema_created = True
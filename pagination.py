@@ -0,0 +1,42 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id):
+    """ Build the opaque cursor pointing after the row with id `last_id`. """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ Return the id a cursor points after, raising a 400 for anything we didn't issue. """
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+def paginate(statement, id_column, cursor, offset, limit):
+    """
+        Apply keyset pagination when a cursor is given, `offset/limit` otherwise.
+        With a cursor the query seeks straight to `id > last_id` through the primary key,
+        so every page costs the same however deep it is.
+    """
+    statement = statement.order_by(id_column)
+    if cursor is not None:
+        statement = statement.where(id_column > decode_cursor(cursor))
+    else:
+        statement = statement.offset(offset)
+    return statement.limit(limit)
+
+
+def set_next_cursor(response, rows, limit):
+    """ Advertise the cursor of the next page when this page is full. """
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
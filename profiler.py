@@ -0,0 +1,196 @@
+import asyncio
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Innermost frames of threads waiting for work, which are left out of the samples
+IDLE_FRAMES = {("thread.py", "_worker"), ("threading.py", "wait")}
+
+
+# ASGI scope of the sampled request the current context works for, carried into worker threads
+sampled_request = contextvars.ContextVar("sampled_request", default=None)
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _route(scope):
+    route = scope.get("route")
+    return route.path if route is not None else scope["path"]
+
+
+class SamplingProfiler:
+    """
+    Wall-clock profiler sampling the stacks of selected requests.
+
+    While at least one sampled request is in flight, a daemon thread wakes up every
+    ``interval`` seconds and records stacks prefixed with the request's route:
+
+    * the event loop thread's, while the request's own task is the one running on it
+      (not while it awaits and the loop runs other requests);
+    * those of worker threads running ``metrics.to_thread`` work on behalf of the
+      request, which the ``sampled_request`` context variable carries to them, under
+      a ``[worker thread]`` frame.
+
+    The stacks of other busy threads are recorded under ``[other thread]``. The
+    samples are aggregated in memory as flamegraph "collapsed stacks" (frames joined
+    by ``;`` and a count per stack). While disabled nothing runs but one attribute
+    check per request in ProfilingMiddleware.
+
+    Attributes:
+        enabled (bool): Whether requests are being sampled.
+        path (re.Pattern or None): Only sample requests whose path matches.
+        header (str or None): Always sample requests carrying this header.
+        rate (float): Fraction of the other matching requests to sample.
+        interval (float): Seconds between two samples.
+        stacks (dict): Samples counted by collapsed stack, for at most ``max_stacks`` stacks.
+    """
+
+    def __init__(self, interval=0.005, max_stacks=10000, max_depth=128):
+        self.enabled = False
+        self.path = None
+        self.header = None
+        self.rate = 1.0
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.stacks = {}
+        self.samples = 0
+        self.dropped = 0
+        self._active = {}  # request token -> (event loop thread id, event loop, task, ASGI scope)
+        self._workers = {}  # worker thread id -> ASGI scope of the sampled request it works for
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enable(self, path=None, header=None, rate=1.0, interval=None):
+        self.path = re.compile(path) if path else None
+        self.header = header.lower().encode("latin-1") if header else None
+        self.rate = rate
+        if interval:
+            self.interval = interval
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.samples = 0
+            self.dropped = 0
+
+    def wants(self, scope):
+        """ Whether to sample the request of ``scope``. """
+        if self.header is not None and any(name == self.header for name, _ in scope["headers"]):
+            return True
+        if self.path is not None and not self.path.search(scope["path"]):
+            return False
+        return self.rate >= 1.0 or random.random() < self.rate
+
+    def begin(self, scope):
+        """ Start sampling the calling task for a request. Returns the token to pass to ``end``. """
+        token = object()
+        self._active[token] = (threading.get_ident(), asyncio.get_running_loop(), asyncio.current_task(), scope)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+        return token
+
+    def end(self, token):
+        self._active.pop(token, None)
+        if not self._active:
+            self._wake.clear()
+
+    @contextmanager
+    def worker(self):
+        """ Credit the samples of the calling worker thread to the sampled request it works for, if any. """
+        scope = sampled_request.get()
+        if scope is None:
+            yield
+            return
+        thread_id = threading.get_ident()
+        self._workers[thread_id] = scope
+        try:
+            yield
+        finally:
+            self._workers.pop(thread_id, None)
+
+    def collapsed(self):
+        """ The samples in the collapsed stack format read by flamegraph.pl and speedscope. """
+        with self._lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            self._sample(me)
+            time.sleep(self.interval)
+
+    def _sample(self, me):
+        active = list(self._active.values())
+        if not active:
+            return  # The requests ended while the thread was waking up
+        workers = dict(self._workers)
+        frames = sys._current_frames()
+        loops = {}  # event loop thread id -> (event loop, {task: ASGI scope})
+        for thread_id, loop, task, scope in active:
+            loops.setdefault(thread_id, (loop, {}))[1][task] = scope
+        collected = []
+        for thread_id, frame in frames.items():
+            if thread_id == me:
+                continue
+            if thread_id in loops:
+                loop, tasks = loops[thread_id]
+                scope = tasks.get(asyncio.current_task(loop))
+                if scope is not None:
+                    collected.append((_route(scope), frame))
+            elif thread_id in workers:
+                collected.append((f"{_route(workers[thread_id])};[worker thread]", frame))
+            elif (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) not in IDLE_FRAMES:
+                collected.append(("[other thread]", frame))
+        with self._lock:
+            for label, frame in collected:
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack = ";".join([label, *reversed(names)])
+                if stack in self.stacks:
+                    self.stacks[stack] += 1
+                elif len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] = 1
+                else:
+                    self.dropped += 1
+                self.samples += 1
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilingMiddleware:
+    """ ASGI middleware handing the requests selected by a SamplingProfiler over to it. """
+
+    def __init__(self, app, profiler=profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.enabled or scope["type"] != "http" or not self.profiler.wants(scope):
+            return await self.app(scope, receive, send)
+        token = self.profiler.begin(scope)
+        context_token = sampled_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampled_request.reset(context_token)
+            self.profiler.end(token)
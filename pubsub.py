@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+
+# Longest line (one published message) the Unix socket broker accepts
+MAX_LINE = 1024 * 1024
+
+
+class PubSubBackend:
+    """
+    Interface of the channel used to relay chat messages between worker processes.
+
+    Each worker delivers a message to its own websockets directly and publishes it
+    so the other workers can deliver it to theirs; a backend must therefore never
+    hand a process back its own messages. Implement these methods to plug in a
+    network broker (e.g. Redis pub/sub) and fan out across hosts.
+    """
+
+    async def start(self, on_message):
+        """ Begin passing messages published by other processes to ``await on_message(channel, message)``. """
+        raise NotImplementedError
+
+    async def publish(self, channel, message):
+        """ Send ``message`` on ``channel`` to the other processes. """
+        raise NotImplementedError
+
+    async def close(self):
+        """ Stop relaying and release the backend's resources. """
+        raise NotImplementedError
+
+
+class LocalPubSub(PubSubBackend):
+    """ Backend of a single process: there is nobody else to relay messages to. """
+
+    async def start(self, on_message):
+        pass
+
+    async def publish(self, channel, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+class _Peer:
+    """ A worker connected to the broker, with a bounded queue of lines to send it. """
+
+    def __init__(self, writer, max_queue):
+        self.writer = writer
+        self.queue = asyncio.Queue(max_queue)
+        self.dropped = 0
+        self.task = asyncio.create_task(self._write())
+
+    def offer(self, line):
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _write(self):
+        try:
+            while True:
+                self.writer.write(await self.queue.get())
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+class UnixSocketPubSub(PubSubBackend):
+    """
+    Backend relaying messages between the workers of one host over a Unix socket.
+
+    The first worker to take an exclusive lock on ``<path>.lock`` also runs the broker
+    listening on ``path``; every worker, that one included, connects to it. The broker
+    forwards each line it reads to every other connection through a bounded queue, so a
+    stalled worker only loses its own messages. The lock is released when its holder
+    exits, and the workers that lose their connection elect a new broker and reconnect.
+    Messages published while disconnected are dropped. Only available on POSIX systems.
+
+    Attributes:
+        path (str): Path of the broker's socket.
+        max_queue (int): Lines the broker may hold for a worker before dropping them.
+    """
+
+    def __init__(self, path, max_queue=1024):
+        if os.name != "posix":
+            raise RuntimeError("The unix chat pub/sub backend needs Unix sockets; use the local backend on this system")
+        self.path = path
+        self.max_queue = max_queue
+        self._on_message = None
+        self._writer = None
+        self._task = None
+        self._lock_file = None
+        self._server = None
+        self._peers = set()
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        self._task = asyncio.create_task(self._run())
+
+    async def publish(self, channel, message):
+        writer = self._writer
+        if writer is None:
+            return
+        writer.write(json.dumps({"channel": channel, "message": message}).encode() + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        for peer in list(self._peers):
+            peer.close()
+        if self._server is not None:
+            self._server.close()
+            os.unlink(self.path)
+            self._lock_file.close()
+
+    async def _run(self):
+        """ Stay connected to the broker, electing one when there is none, and dispatch what it sends. """
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE)
+            except OSError:
+                await self._lead()
+                await asyncio.sleep(0.05)
+                continue
+            self._writer = writer
+            try:
+                async for line in reader:
+                    envelope = json.loads(line)
+                    await self._on_message(envelope["channel"], envelope["message"])
+            except (ConnectionError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+
+    async def _lead(self):
+        """ Start the broker unless another process holds the lock. """
+        if self._server is not None:
+            return
+        import fcntl
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a broker that died
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=MAX_LINE)
+
+    async def _serve(self, reader, writer):
+        """ Broker side of one worker's connection: forward its lines to every other worker. """
+        peer = _Peer(writer, self.max_queue)
+        self._peers.add(peer)
+        try:
+            async for line in reader:
+                for other in self._peers:
+                    if other is not peer:
+                        other.offer(line)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass  # Cancelled when this process shuts down; end quietly like a dropped connection
+        finally:
+            self._peers.discard(peer)
+            peer.close()
+
+
+def get_pubsub(settings):
+    """ Build the chat relay selected by ``settings.chat_pubsub_backend``. """
+    if settings.chat_pubsub_backend == "unix":
+        return UnixSocketPubSub(settings.chat_pubsub_path)
+    return LocalPubSub()
@@ -0,0 +1,70 @@
+import secrets
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from configs import get_settings
+from models import ProfilerSettings, Tags
+from profiler import profiler
+from startup import startup_timer
+
+
+def require_admin(x_admin_token: Annotated[str | None, Header()] = None):
+    """ Admin routes need the `admin_token` setting in the X-Admin-Token header, and are disabled without one. """
+    admin_token = get_settings().admin_token
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+def _status():
+    return {
+        'enabled': profiler.enabled,
+        'path': profiler.path.pattern if profiler.path else None,
+        'header': profiler.header.decode('latin-1') if profiler.header else None,
+        'rate': profiler.rate,
+        'interval': profiler.interval,
+        'samples': profiler.samples,
+        'stacks': len(profiler.stacks),
+        'dropped': profiler.dropped,
+    }
+
+
+@router.get('/profiler', tags=[Tags.admin])
+async def get_profiler():
+    """ Retrieve the profiler's settings and how much it has sampled. """
+    return _status()
+
+
+@router.post('/profiler', tags=[Tags.admin])
+async def start_profiler(settings: ProfilerSettings):
+    """ Start sampling requests matching `path`, or carrying `header`, at the given `rate`. """
+    profiler.enable(settings.path, settings.header, settings.rate, settings.interval)
+    return _status()
+
+
+@router.delete('/profiler', tags=[Tags.admin])
+async def stop_profiler():
+    """ Stop sampling requests; the samples taken so far are kept. """
+    profiler.disable()
+    return _status()
+
+
+@router.get('/profiler/stacks', response_class=PlainTextResponse, tags=[Tags.admin])
+async def get_profiler_stacks(reset: Annotated[bool, Query()] = False):
+    """ Download the samples as collapsed stacks, for flamegraph.pl or speedscope. Optionally reset them. """
+    stacks = profiler.collapsed()
+    if reset:
+        profiler.reset()
+    return stacks
+
+
+@router.get('/startup', tags=[Tags.admin])
+async def get_startup_time():
+    """ Retrieve how long each step of starting this worker took. """
+    return startup_timer.report()
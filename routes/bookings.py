@@ -1,51 +1,110 @@
+from datetime import datetime
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Form, HTTPException
+from fastapi import APIRouter, Body, Form, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
 
-from data import DummyDataBase
-from models import Booking, BookingBaseModel, Tags
+from availability import IntervalIndex, parse_datetime, room_locks
+from data import get_async_database
+from fast_json import fast_json_enabled, ndjson_response, trusted_json_response
+from models import Booking, BookingBaseModel, BookingQuote, BookingQuoteModel, BulkItemResult, Tags, price_bookings
 
 router = APIRouter()
 
 
 @router.get('/', response_model=list[Booking], tags=[Tags.bookings])
-def get_all_bookings():
+async def get_all_bookings():
     """ Retrieve all bookings from the dummy database. """
-    db = DummyDataBase(model='bookings')
-    return db.retrieve_all()
+    db = get_async_database('bookings')
+    bookings = await db.retrieve_all()
+    if fast_json_enabled():
+        return trusted_json_response(bookings)
+    return bookings
+
+
+@router.get('/export', tags=[Tags.bookings])
+async def export_bookings(
+        room_id: Annotated[UUID | None, Query()] = None,
+        start_datetime: Annotated[datetime | None, Query()] = None,
+        end_datetime: Annotated[datetime | None, Query()] = None,
+):
+    """
+        Stream all bookings as NDJSON, one booking per line.
+        Optionally keep only the bookings of room_id, or those overlapping start_datetime/end_datetime.
+    """
+    db = get_async_database('bookings')
+    filters = {'room_id': str(room_id)} if room_id else {}
+    return ndjson_response(db.iter_batches(start=start_datetime, end=end_datetime, **filters))
+
+
+@router.post('/bulk', response_model=list[BulkItemResult], tags=[Tags.bookings])
+async def bulk_room_booking(bookings_data: list[BookingBaseModel]):
+    """
+        Create many bookings with a single write. Send the list as JSON.
+        Each booking follows the same rules as a single booking, and a booking overlapping
+        an earlier booking of the same batch is rejected too.
+    """
+    db = get_async_database('bookings')
+    rooms_db = get_async_database('rooms')
+
+    results = [None] * len(bookings_data)
+    rooms = {}
+    pending = []
+    for index, booking_data in enumerate(bookings_data):
+        if booking_data.room_id not in rooms:
+            rooms[booking_data.room_id] = await rooms_db.retrieve(booking_data.room_id)
+        room = rooms[booking_data.room_id]
+        if room is None:
+            results[index] = {'index': index, 'ok': False, 'detail': "Room not found"}
+        elif booking_data.end_datetime <= booking_data.start_datetime:
+            detail = "End datetime shall be greater than Start datetime"
+            results[index] = {'index': index, 'ok': False, 'detail': detail}
+        else:
+            booking_data.nights = booking_data.calculate_nights()
+            pending.append((index, booking_data, booking_data.nights * room.get('price_per_night')))
+
+    for result in await db.run_sync(_book_available_rooms, pending, await rooms_db.database()):
+        results[result['index']] = result
+    return results
+
+
+@router.delete('/bulk', response_model=list[BulkItemResult], tags=[Tags.bookings])
+async def bulk_cancel_booking(booking_ids: Annotated[list[UUID], Body()]):
+    """ Cancel many bookings with a single write. """
+    db = get_async_database('bookings')
+    cancelled = await db.bulk_delete(booking_ids)
+    return [
+        {'index': index, 'ok': ok, 'id': booking_id, 'detail': None if ok else 'Booking not found'}
+        for index, (booking_id, ok) in enumerate(zip(booking_ids, cancelled))
+    ]
 
 
 @router.get('/{booking_id}', response_model=Booking, tags=[Tags.bookings])
-def get_single_booking(booking_id: UUID):
+async def get_single_booking(booking_id: UUID):
     """ Retrieve a single booking by its UUID. """
-    db = DummyDataBase(model='bookings')
-    booking = db.retrieve(booking_id)
+    db = get_async_database('bookings')
+    booking = await db.retrieve(booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail='Booking not found')
-    return db.retrieve(booking_id)
+    return booking
 
 
 @router.post('/', response_model=Booking, tags=[Tags.bookings])
-def room_booking(booking_data: Annotated[BookingBaseModel, Form()]):
+async def room_booking(booking_data: Annotated[BookingBaseModel, Form()]):
     """
         Create a new booking if the room is available.
         Validates room existence, availability in the given date range,
         and ensures proper booking dates.
     """
-    db = DummyDataBase(model='bookings')
-    rooms_db = DummyDataBase(model='rooms')
+    db = get_async_database('bookings')
+    rooms_db = get_async_database('rooms')
 
     room_id = booking_data.room_id
-    room = rooms_db.retrieve(room_id)
-    bookings = [row for row in db.retrieve_all() if row.get('room_id') == str(room_id)]
+    room = await rooms_db.retrieve(room_id)
 
-    # Validate room availability before booking
     if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
-    if booking_data.is_room_available(bookings) is False:
-        raise HTTPException(status_code=400, detail="Room is not available for selected date range")
 
     # Validate Start and End Date
     if booking_data.end_datetime <= booking_data.start_datetime:
@@ -55,8 +114,8 @@ def room_booking(booking_data: Annotated[BookingBaseModel, Form()]):
     booking_data.nights = booking_data.calculate_nights()
     total_price = booking_data.nights * room.get('price_per_night')
 
-    # Book a room and then mark as not available
-    booked = db.create(**jsonable_encoder(booking_data), total_price=total_price)
+    # Check availability and book under the room's lock and the bookings' exclusive hold, so bookings can't overlap
+    booked = await db.run_sync(_book_available_room, booking_data, total_price, await rooms_db.database())
     if booked is None:
         raise HTTPException(status_code=500, detail="Something Went Wrong while booking")
 
@@ -65,16 +124,81 @@ def room_booking(booking_data: Annotated[BookingBaseModel, Form()]):
     return booked
 
 
+def _book_available_room(db, booking_data, total_price, rooms_db):
+    """
+        Create the booking unless it overlaps another or its room was deleted meanwhile.
+        Runs in a worker thread as it blocks on the room's lock, then on the bookings held
+        exclusively against other processes until the booking is written.
+    """
+    with room_locks.hold(str(booking_data.room_id)), db.exclusive():
+        if rooms_db.retrieve(booking_data.room_id) is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+        if db.overlapping(booking_data.start_datetime, booking_data.end_datetime, room_id=booking_data.room_id):
+            raise HTTPException(status_code=400, detail="Room is not available for selected date range")
+        return db.create(**jsonable_encoder(booking_data), total_price=total_price)
+
+
+def _book_available_rooms(db, pending, rooms_db):
+    """
+        Bulk version of `_book_available_room` for (index, booking_data, total_price) items.
+        Accepted bookings are also indexed locally, to catch overlaps within the batch.
+    """
+    results = []
+    accepted = []
+    batch = IntervalIndex()
+    rooms = {}
+    with room_locks.hold_many(str(booking_data.room_id) for _, booking_data, _ in pending), db.exclusive():
+        for index, booking_data, total_price in pending:
+            room_id = str(booking_data.room_id)
+            start, end = parse_datetime(booking_data.start_datetime), parse_datetime(booking_data.end_datetime)
+            if room_id not in rooms:
+                rooms[room_id] = rooms_db.retrieve(room_id) is not None
+            if not rooms[room_id]:
+                results.append({'index': index, 'ok': False, 'detail': "Room not found"})
+            elif db.overlapping(start, end, room_id=room_id) or batch.overlapping(room_id, start, end):
+                results.append({'index': index, 'ok': False, 'detail': "Room is not available for selected date range"})
+            else:
+                batch.add(room_id, start, end, index)
+                accepted.append((index, {**jsonable_encoder(booking_data), 'total_price': total_price}))
+        booked = db.bulk_create([record for _, record in accepted])
+    results += [{'index': index, 'ok': True, 'id': record['id']} for (index, _), record in zip(accepted, booked)]
+    return results
+
+
+@router.post('/quote', response_model=list[BookingQuote], tags=[Tags.bookings])
+async def quote_bookings(quotes: list[BookingQuoteModel]):
+    """
+        Price a batch of stays without booking them.
+        Availability is not checked, only nights and total price are calculated.
+    """
+    rooms_db = get_async_database('rooms')
+    prices = {}
+    for quote in quotes:
+        if quote.room_id not in prices:
+            room = await rooms_db.retrieve(quote.room_id)
+            if room is None:
+                raise HTTPException(status_code=404, detail=f"Room {quote.room_id} not found")
+            prices[quote.room_id] = room.get('price_per_night')
+        if quote.end_datetime <= quote.start_datetime:
+            raise HTTPException(status_code=400, detail="End datetime shall be greater than Start datetime")
+
+    priced = price_bookings(((q.room_id, q.start_datetime, q.end_datetime) for q in quotes), prices)
+    return [
+        {**quote.model_dump(), 'nights': nights, 'total_price': total_price}
+        for quote, (nights, total_price) in zip(quotes, priced)
+    ]
+
+
 @router.delete('/{booking_id}', tags=[Tags.bookings])
-def cancel_booking(booking_id: UUID):
+async def cancel_booking(booking_id: UUID):
     """ Cancel an existing booking. """
     # Cancel booking and mark room as available
-    db = DummyDataBase(model='bookings')
-    booking = db.retrieve(booking_id)
+    db = get_async_database('bookings')
+    booking = await db.retrieve(booking_id)
     if not booking:
         raise HTTPException(status_code=400, detail='Booking not found')
 
-    cancelled = db.delete(booking_id)
+    cancelled = await db.delete(booking_id)
     if cancelled is False:
         raise HTTPException(status_code=500, detail='Something Went Wrong while cancelling booking')
 
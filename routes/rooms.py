@@ -1,75 +1,172 @@
+from datetime import datetime
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Form, Query, HTTPException
+from fastapi import APIRouter, Body, Form, Query, HTTPException
 from fastapi.encoders import jsonable_encoder
 
-from data import DummyDataBase
-from models import Room, RoomBaseModel, RoomType, Tags
+from availability import room_locks
+from data import get_async_database
+from fast_json import fast_json_enabled, ndjson_response, trusted_json_response
+from models import BookingDateTimeModel, BulkItemResult, Room, RoomAvailability, RoomBaseModel, RoomBulkUpdateModel, \
+    RoomType, Tags
 
 router = APIRouter()
 
 
 @router.get('/', response_model=list[Room], tags=[Tags.rooms])
-def get_rooms(room_type: Annotated[RoomType | None, Query()] = None):
+async def get_rooms(room_type: Annotated[RoomType | None, Query()] = None):
     """ Retrieve all rooms, optionally filtering by room_type. """
-    db = DummyDataBase(model='rooms')
-    rooms = db.retrieve_all()
-    if room_type:
-        rooms = [room for room in rooms if room.get('room_type') == room_type]
+    db = get_async_database('rooms')
+    filters = {'room_type': room_type} if room_type else {}
+    rooms = await db.retrieve_all(**filters)
+    if fast_json_enabled():
+        return trusted_json_response(rooms)
     return rooms
 
 
+@router.get('/export', tags=[Tags.rooms])
+async def export_rooms(room_type: Annotated[RoomType | None, Query()] = None):
+    """ Stream all rooms as NDJSON, one room per line, optionally filtering by room_type. """
+    db = get_async_database('rooms')
+    filters = {'room_type': room_type} if room_type else {}
+    return ndjson_response(db.iter_batches(**filters))
+
+
+@router.get('/available', response_model=list[RoomAvailability], tags=[Tags.rooms])
+async def get_available_rooms(
+        start_datetime: Annotated[datetime, Query()],
+        end_datetime: Annotated[datetime, Query()],
+        room_type: Annotated[RoomType | None, Query()] = None,
+):
+    """
+        Retrieve every room free for the whole date range, with the price of staying.
+        Booked rooms are collected in one pass over the bookings interval index.
+    """
+    dates = BookingDateTimeModel(start_datetime=start_datetime, end_datetime=end_datetime)
+    if dates.end_datetime <= dates.start_datetime:
+        raise HTTPException(status_code=400, detail="End datetime shall be greater than Start datetime")
+
+    bookings_db = get_async_database('bookings')
+    booked = {b.get('room_id') for b in await bookings_db.overlapping(dates.start_datetime, dates.end_datetime)}
+    nights = dates.calculate_nights()
+
+    db = get_async_database('rooms')
+    filters = {'room_type': room_type} if room_type else {}
+    return [
+        {**room, 'nights': nights, 'total_price': nights * room.get('price_per_night')}
+        for room in await db.retrieve_all(**filters)
+        if room.get('id') not in booked
+    ]
+
+
+@router.post('/bulk', response_model=list[BulkItemResult], tags=[Tags.rooms])
+async def create_rooms(rooms_data: list[RoomBaseModel]):
+    """ Create many rooms with a single write. Send the list as JSON. """
+    db = get_async_database('rooms')
+    rooms = await db.bulk_create([jsonable_encoder(room_data) for room_data in rooms_data])
+    return [{'index': index, 'ok': True, 'id': room['id']} for index, room in enumerate(rooms)]
+
+
+@router.put('/bulk', response_model=list[BulkItemResult], tags=[Tags.rooms])
+async def update_rooms(rooms_data: list[RoomBulkUpdateModel]):
+    """ Update many rooms, identified by their `id`, with a single write. """
+    db = get_async_database('rooms')
+    rooms = await db.bulk_update([
+        (room_data.id, jsonable_encoder(room_data, exclude={'id'})) for room_data in rooms_data
+    ])
+    return [
+        {'index': index, 'ok': True, 'id': room['id']} if room is not None
+        else {'index': index, 'ok': False, 'id': room_data.id, 'detail': 'Room not found'}
+        for index, (room_data, room) in enumerate(zip(rooms_data, rooms))
+    ]
+
+
+@router.delete('/bulk', response_model=list[BulkItemResult], tags=[Tags.rooms])
+async def delete_rooms(room_ids: Annotated[list[UUID], Body()]):
+    """ Delete many rooms with a single write. Rooms with bookings are skipped. """
+    db = get_async_database('rooms')
+    bookings_db = await get_async_database('bookings').database()
+    return await db.run_sync(_delete_unbooked_rooms, room_ids, bookings_db)
+
+
 @router.get('/{room_id}', response_model=Room, tags=[Tags.rooms])
-def get_single_room(room_id: UUID):
+async def get_single_room(room_id: UUID):
     """ Retrieve a single room by its UUID. """
-    db = DummyDataBase(model='rooms')
-    room = db.retrieve(room_id)
+    db = get_async_database('rooms')
+    room = await db.retrieve(room_id)
     if room is None:
         raise HTTPException(status_code=400, detail='Room not found')
     return room
 
 
 @router.post('/', response_model=Room, tags=[Tags.rooms])
-def create_room(room_data: Annotated[RoomBaseModel, Form()]):
+async def create_room(room_data: Annotated[RoomBaseModel, Form()]):
     """ Create a new room record. """
-    db = DummyDataBase(model='rooms')
-    room = db.create(**jsonable_encoder(room_data))
+    db = get_async_database('rooms')
+    room = await db.create(**jsonable_encoder(room_data))
     if not room:
         raise HTTPException(status_code=500, detail='Something went wrong while creating room')
     return room
 
 
 @router.put('/{room_id}', response_model=Room, tags=[Tags.rooms])
-def update_room(room_id: UUID, room_data: Annotated[RoomBaseModel, Form()]):
+async def update_room(room_id: UUID, room_data: Annotated[RoomBaseModel, Form()]):
     """ Update an existing room's data. """
-    db = DummyDataBase(model='rooms')
-    room = db.retrieve(room_id)
+    db = get_async_database('rooms')
+    room = await db.retrieve(room_id)
     if room is None:
         raise HTTPException(status_code=400, detail='Room not found')
 
-    room = db.update(room_id, **jsonable_encoder(room_data))
+    room = await db.update(room_id, **jsonable_encoder(room_data))
     if not room:
         raise HTTPException(status_code=500, detail='Something went wrong while updating room')
     return room
 
 
 @router.delete('/{room_id}', tags=[Tags.rooms])
-def delete_room(room_id: UUID):
+async def delete_room(room_id: UUID):
     """ Delete a room by its UUID. """
-    db = DummyDataBase(model='rooms')
-    room = db.retrieve(room_id)
+    db = get_async_database('rooms')
+    room = await db.retrieve(room_id)
     if room is None:
         raise HTTPException(status_code=400, detail='Room not found')
 
-    # Check bookings for room to be deleted
-    bookings_db = DummyDataBase(model='bookings')
-    for b in bookings_db.retrieve_all():
-        if b.get('room_id') == str(room_id):
-            # Avoid deletion if booking found
-            raise HTTPException(status_code=400, detail='Can not delete room which is already booked')
-
-    deleted = db.delete(room_id)
+    # Check bookings for room to be deleted, holding the room's lock so no booking sneaks in
+    bookings_db = await get_async_database('bookings').database()
+    deleted = await db.run_sync(_delete_unbooked_room, room_id, bookings_db)
     if deleted is False:
         raise HTTPException(status_code=500, detail='Something Went Wrong while deleting room')
     return deleted
+
+
+def _delete_unbooked_room(db, room_id, bookings_db):
+    """
+        Delete a room unless it has bookings. Runs in a worker thread as it blocks on the room's lock,
+        then on the bookings held exclusively so no other process books the room meanwhile.
+    """
+    with room_locks.hold(str(room_id)), bookings_db.exclusive():
+        if bookings_db.retrieve_all(room_id=str(room_id)):
+            # Avoid deletion if booking found
+            raise HTTPException(status_code=400, detail='Can not delete room which is already booked')
+        return db.delete(room_id)
+
+
+def _delete_unbooked_rooms(db, room_ids, bookings_db):
+    """ Bulk version of `_delete_unbooked_room`, reporting the outcome per room. """
+    results = [None] * len(room_ids)
+    deletable = []
+    with room_locks.hold_many(str(room_id) for room_id in room_ids), bookings_db.exclusive():
+        for index, room_id in enumerate(room_ids):
+            if db.retrieve(room_id) is None:
+                results[index] = {'index': index, 'ok': False, 'id': room_id, 'detail': 'Room not found'}
+            elif bookings_db.retrieve_all(room_id=str(room_id)):
+                results[index] = {
+                    'index': index, 'ok': False, 'id': room_id, 'detail': 'Can not delete room which is already booked'
+                }
+            else:
+                deletable.append(index)
+        deleted = db.bulk_delete([room_ids[index] for index in deletable])
+    for index, ok in zip(deletable, deleted):
+        results[index] = {'index': index, 'ok': ok, 'id': room_ids[index], 'detail': None if ok else 'Room not found'}
+    return results
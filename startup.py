@@ -0,0 +1,31 @@
+import time
+
+
+class StartupTimer:
+    """
+    Durations of the steps of starting the app, from the import of `main` until the
+    lifespan startup completed, so cold-start time can be tracked.
+
+    Attributes:
+        steps (dict): Seconds spent in each step, in order.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.steps = {}
+
+    def mark(self, step):
+        """ Close ``step``, which started when the previous one ended. """
+        now = time.perf_counter()
+        self.steps[step] = now - self._last
+        self._last = now
+
+    def report(self):
+        return {
+            "steps_ms": {step: round(seconds * 1000, 3) for step, seconds in self.steps.items()},
+            "total_ms": round(sum(self.steps.values()) * 1000, 3),
+        }
+
+
+startup_timer = StartupTimer()
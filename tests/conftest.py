@@ -0,0 +1,49 @@
+"""
+Shared setup of the test suite.
+
+The app runs from a temporary directory, so its JSON files, SQLite database and
+error log never touch the working tree; only the templates and static files are
+linked in.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="booking-tests-")
+for name in ("templates", "static"):
+    os.symlink(os.path.join(ROOT, name), os.path.join(WORKDIR, name))
+os.chdir(WORKDIR)
+os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
+os.environ["DATABASE_URL"] = "sqlite:///test.db"
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session", autouse=True)
+def stores():
+    """ Flush the JSON stores while still in WORKDIR, as their paths are relative to it. """
+    yield
+    from data import _stores, flush_all
+    # pytest leaves WORKDIR before the interpreter exits and runs the atexit flush
+    flush_all()
+    _stores.clear()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """ A client of the app with its lifespan running, shared by the whole session. """
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(params=["json", "sql"])
+def storage_backend(request, monkeypatch):
+    """ Run the test once per storage backend of rooms and bookings. """
+    from configs import get_settings
+    monkeypatch.setattr(get_settings(), "storage_backend", request.param)
+    return request.param
@@ -0,0 +1,17 @@
+import pytest
+
+from configs import get_settings
+
+HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(get_settings(), "admin_token", "secret")
+
+
+def test_invalid_profiler_path_is_rejected(client):
+    response = client.post("/admin/profiler", json={"path": "(["}, headers=HEADERS)
+    assert response.status_code == 422
+    assert "Invalid regular expression" in response.text
+    assert client.get("/admin/profiler", headers=HEADERS).json()["enabled"] is False
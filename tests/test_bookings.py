@@ -0,0 +1,205 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from random import Random
+from types import SimpleNamespace
+
+import httpx
+from fastapi import HTTPException
+
+
+def create_room(client):
+    response = client.post("/rooms/", data={"room_type": "Single", "price_per_night": 100})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def send_at_once(client, requests):
+    """ Send (method, url, form data) requests together on the app's event loop, so their work interleaves. """
+    async def send_all():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=client.app), base_url="http://test") as http:
+            return await asyncio.gather(*(http.request(method, url, data=data) for method, url, data in requests))
+
+    return client.portal.call(send_all)
+
+
+def test_concurrent_overlapping_bookings_accept_exactly_one(client, storage_backend):
+    room_id = create_room(client)
+    # Every stay covers 2030-01-01 18:00 to 2030-01-02 12:00, so any two of them overlap
+    stays = [(f"2030-01-01T{12 + i % 6:02d}:00:00", f"2030-01-0{2 + i % 5}T12:00:00") for i in range(50)]
+
+    statuses = [response.status_code for response in send_at_once(client, [
+        ("POST", "/bookings/", {
+            "room_id": room_id, "guest_name": "Guest", "nights": 1, "start_datetime": start, "end_datetime": end,
+        })
+        for start, end in stays
+    ])]
+
+    assert statuses.count(200) == 1
+    assert statuses.count(400) == len(stays) - 1
+    assert len(client.get("/bookings/export", params={"room_id": room_id}).text.splitlines()) == 1
+
+
+def test_concurrent_bookings_of_several_rooms_are_all_stored(client, storage_backend):
+    rooms = [create_room(client) for _ in range(8)]
+    random = Random(6)
+    requests = []
+    for _ in range(200):
+        start = datetime(2033, 1, 1, 12, tzinfo=timezone.utc) + timedelta(days=random.randrange(30))
+        end = start + timedelta(days=random.randrange(1, 4))
+        requests.append(("POST", "/bookings/", {
+            "room_id": random.choice(rooms), "guest_name": "Guest", "nights": 1,
+            "start_datetime": start.isoformat(), "end_datetime": end.isoformat(),
+        }))
+
+    responses = send_at_once(client, requests)
+
+    assert {response.status_code for response in responses} <= {200, 400}
+    accepted = {response.json()["id"] for response in responses if response.status_code == 200}
+    stored = []
+    for room_id in rooms:
+        export = client.get("/bookings/export", params={"room_id": room_id})
+        bookings = [json.loads(line) for line in export.text.splitlines()]
+        assert bookings, "Every room gets its first booking"
+        stays = sorted(
+            (datetime.fromisoformat(booking["start_datetime"]), datetime.fromisoformat(booking["end_datetime"]))
+            for booking in bookings
+        )
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(stays, stays[1:]))
+        stored += [booking["id"] for booking in bookings]
+    # No accepted booking was lost, and none was stored without being accepted
+    assert sorted(stored) == sorted(accepted)
+
+
+def test_booking_racing_the_deletion_of_its_room_is_not_stored(client, storage_backend):
+    rooms = [create_room(client) for _ in range(20)]
+    requests = []
+    for position, room_id in enumerate(rooms):
+        pair = [
+            ("POST", "/bookings/", {
+                "room_id": room_id, "guest_name": "Guest", "nights": 1,
+                "start_datetime": "2034-01-01T12:00:00", "end_datetime": "2034-01-02T12:00:00",
+            }),
+            ("DELETE", f"/rooms/{room_id}", None),
+        ]
+        # Sent in both orders, so either may take the room's lock first
+        requests += pair if position % 2 else pair[::-1]
+    responses = send_at_once(client, requests)
+
+    for position, room_id in enumerate(rooms):
+        first, second = responses[2 * position], responses[2 * position + 1]
+        booked, deleted = (first, second) if position % 2 else (second, first)
+        bookings = client.get("/bookings/export", params={"room_id": room_id}).text.splitlines()
+        if deleted.status_code == 200:
+            assert booked.status_code == 404
+            assert not bookings
+        else:
+            assert (booked.status_code, deleted.status_code) == (200, 400)
+            assert len(bookings) == 1
+
+
+def book(client, room_id, start, end):
+    return client.post("/bookings/", data={
+        "room_id": room_id, "guest_name": "Guest", "nights": 1, "start_datetime": start, "end_datetime": end,
+    })
+
+
+def test_overlaps_are_checked_by_instant_across_offsets(client, storage_backend):
+    room_id = create_room(client)
+    # 2030-01-01 09:00 to 2030-01-03 05:00 UTC
+    booked = book(client, room_id, "2030-01-01T14:00:00+05:00", "2030-01-03T10:00:00+05:00")
+    assert booked.status_code == 200
+
+    # 2030-01-01 08:00 to 14:00 UTC overlaps, although its wall-clock times come first
+    assert book(client, room_id, "2029-12-31T20:00:00-12:00", "2030-01-01T02:00:00-12:00").status_code == 400
+    # 2030-01-03 06:00 UTC onwards is free, although its wall-clock start comes first
+    assert book(client, room_id, "2030-01-03T06:00:00+00:00", "2030-01-04T06:00:00+00:00").status_code == 200
+
+    stored = client.get(f"/bookings/{booked.json()['id']}").json()
+    assert datetime.fromisoformat(stored["start_datetime"]) == datetime(2030, 1, 1, 9, tzinfo=timezone.utc)
+    assert datetime.fromisoformat(stored["end_datetime"]) == datetime(2030, 1, 3, 5, tzinfo=timezone.utc)
+
+
+def test_available_rooms_compare_naive_and_aware_datetimes(client, storage_backend):
+    naive_room, aware_room = create_room(client), create_room(client)
+    assert book(client, naive_room, "2031-01-01T14:00:00", "2031-01-03T10:00:00").status_code == 200
+    assert book(client, aware_room, "2031-01-01T14:00:00+00:00", "2031-01-03T10:00:00+00:00").status_code == 200
+
+    # Naive datetimes are taken as UTC, whether stored or searched
+    searches = [("2031-01-02T12:00:00Z", "2031-01-04T12:00:00Z"), ("2031-01-02T12:00:00", "2031-01-04T12:00:00")]
+    for start, end in searches:
+        response = client.get("/rooms/available", params={"start_datetime": start, "end_datetime": end})
+        assert response.status_code == 200
+        assert not {naive_room, aware_room} & {room["id"] for room in response.json()}
+
+    response = client.get("/rooms/available", params={
+        "start_datetime": "2031-01-03T12:00:00+02:00", "end_datetime": "2031-01-04T12:00:00+02:00",
+    })
+    assert {naive_room, aware_room} <= {room["id"] for room in response.json()}
+
+
+def test_export_filters_naive_and_aware_bookings_by_instant(client, storage_backend):
+    room_id = create_room(client)
+    naive = book(client, room_id, "2032-01-01T14:00:00", "2032-01-02T10:00:00").json()["id"]
+    aware = book(client, room_id, "2032-01-05T14:00:00+02:00", "2032-01-06T10:00:00+02:00").json()["id"]
+
+    def export(start, end):
+        response = client.get("/bookings/export", params={
+            "room_id": room_id, "start_datetime": start, "end_datetime": end,
+        })
+        assert response.status_code == 200
+        return {json.loads(line)["id"] for line in response.text.splitlines()}
+
+    assert export("2032-01-01T00:00:00Z", "2032-01-31T00:00:00Z") == {naive, aware}
+    assert export("2032-01-01T00:00:00", "2032-01-31T00:00:00") == {naive, aware}
+    # The aware booking ends at 08:00 UTC, the naive one starts at 14:00 UTC
+    assert export("2032-01-06T08:00:00Z", "2032-01-31T00:00:00Z") == set()
+    assert export("2031-12-01T00:00:00+02:00", "2032-01-01T16:00:00+02:00") == set()
+
+
+def test_overlap_check_and_booking_exclude_other_processes(client, storage_backend, monkeypatch):
+    from data import DummyDataBase, _ModelStore, get_database
+    from models import BookingBaseModel
+    from routes import bookings
+
+    room_id = create_room(client)
+    booking_data = BookingBaseModel(
+        room_id=room_id, guest_name="Guest", nights=1,
+        start_datetime="2035-01-01T12:00:00", end_datetime="2035-01-02T12:00:00",
+    )
+    rooms_db = get_database("rooms")
+    db = get_database("bookings")
+    # The other process: a store of its own over the same files, or a connection of its own
+    other_db = get_database("bookings")
+    if isinstance(other_db, DummyDataBase):
+        other_db._store = _ModelStore(db._store.file_name, journal=True)
+    # Room locks only exist within a process
+    monkeypatch.setattr(bookings, "room_locks", SimpleNamespace(hold=lambda key: nullcontext()))
+
+    checked = threading.Event()
+    outcome = {}
+
+    def overlapping(*args, **kwargs):
+        found = type(db).overlapping(db, *args, **kwargs)
+        checked.set()
+        time.sleep(0.3)  # Gives the other process time to book in between, if it can
+        return found
+
+    def book_in_other_process():
+        checked.wait(timeout=5)
+        try:
+            outcome["other"] = bookings._book_available_room(other_db, booking_data, 100, rooms_db)
+        except HTTPException as e:
+            outcome["other"] = e.status_code
+
+    db.overlapping = overlapping
+    other = threading.Thread(target=book_in_other_process)
+    other.start()
+    booked = bookings._book_available_room(db, booking_data, 100, rooms_db)
+    other.join()
+
+    assert outcome["other"] == 400
+    assert [b["id"] for b in get_database("bookings").retrieve_all(room_id=room_id)] == [booked["id"]]
@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+
+from cache import LRUCache, ResponseCacheMiddleware
+
+
+def test_get_racing_a_write_is_not_cached():
+    rooms = ["old"]
+    reading = asyncio.Event()
+    written = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["method"] == "GET":
+            body = ",".join(rooms).encode()
+            if scope["query_string"] == b"slow=1":
+                reading.set()
+                await written.wait()  # The write lands while this response is being built
+        else:
+            rooms.append("new")
+            body = b"ok"
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    cached_app = ResponseCacheMiddleware(
+        app, backend=LRUCache(), cached_routes=[(r"/rooms/", {"rooms"})], invalidations=[(r"/rooms/", {"rooms"})],
+    )
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=cached_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            slow = asyncio.create_task(http.get("/rooms/", params={"slow": 1}))
+            await reading.wait()
+            await http.post("/rooms/")
+            written.set()
+            assert (await slow).text == "old"
+            # The stale body was not cached, so the next request sees the write
+            response = await http.get("/rooms/", params={"slow": 1})
+            assert response.text == "old,new"
+            assert response.headers["x-cache"] == "MISS"
+
+    asyncio.run(scenario())
+
+
+def test_set_skips_values_built_before_an_invalidation():
+    cache = LRUCache()
+    generation = cache.generation({"rooms", "teams"})
+    cache.invalidate({"teams"})
+    cache.set("/rooms/?", "stale", {"rooms", "teams"}, generation)
+    assert cache.get("/rooms/?") is None
+
+    generation = cache.generation({"rooms"})
+    cache.invalidate({"heroes"})
+    cache.set("/rooms/?", "fresh", {"rooms"}, generation)
+    assert cache.get("/rooms/?") == "fresh"
+
+
+def test_only_writes_invalidate():
+    backend = LRUCache()
+    invalidated = []
+    backend.invalidate = invalidated.append
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    cached_app = ResponseCacheMiddleware(app, backend, cached_routes=[], invalidations=[(r"/rooms/", {"rooms"})])
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=cached_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            for method in ("HEAD", "OPTIONS", "GET", "POST", "PUT", "PATCH", "DELETE"):
+                await http.request(method, "/rooms/")
+
+    asyncio.run(scenario())
+    assert invalidated == [{"rooms"}] * 4
@@ -0,0 +1,27 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from data import AsyncDummyDataBase, DummyDataBase
+
+
+def test_async_reads_catch_up_off_the_event_loop(monkeypatch):
+    DummyDataBase("loop_reads").create(room_id="room", start_datetime="2030-01-01T12:00:00",
+                                      end_datetime="2030-01-02T12:00:00")
+    store = DummyDataBase("loop_reads")._store
+    syncing_threads = []
+    # As if another process wrote before every call: catching up may wait for the lock file
+    monkeypatch.setattr(store, "stale", lambda: True)
+    monkeypatch.setattr(store, "sync", lambda: syncing_threads.append(threading.current_thread()))
+
+    async def read():
+        db = AsyncDummyDataBase("loop_reads")
+        assert len(await db.retrieve_all()) == 1
+        assert await db.retrieve("missing") is None
+        assert len(await db.overlapping(datetime(2030, 1, 1), datetime(2030, 1, 3), room_id="room")) == 1
+        assert [batch async for batch in db.iter_batches()]
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(read())
+    assert syncing_threads
+    assert loop_thread not in syncing_threads
@@ -0,0 +1,38 @@
+from handle_errors import ErrorLog
+
+
+def raise_error(message):
+    try:
+        raise ValueError(message)
+    except ValueError as exc:
+        return exc
+
+
+def test_traceback_is_logged_when_first_occurrence_is_rate_limited(tmp_path):
+    path = tmp_path / "errors.txt"
+    error_log = ErrorLog(path=str(path), rate=0.001, burst=1, repeat_interval=3600.0)
+    error_log._tokens = 0  # The first occurrence finds the bucket empty
+    error_log.start()
+    error_log.report(raise_error("boom"))
+    error_log._tokens = 1
+    error_log.report(raise_error("boom"))
+    error_log.stop()
+
+    logged = path.read_text()
+    assert error_log.stats[next(iter(error_log.stats))].count == 2
+    assert "Error Traceback: Traceback (most recent call last)" in logged
+    assert "Repeated: 2 times since" in logged
+    assert "Rate limited: 1 entries skipped" in logged
+
+
+def test_repeats_are_summarized_after_the_traceback(tmp_path):
+    path = tmp_path / "errors.txt"
+    error_log = ErrorLog(path=str(path), repeat_interval=0.0)
+    error_log.start()
+    for _ in range(3):
+        error_log.report(raise_error("boom"))
+    error_log.stop()
+
+    logged = path.read_text()
+    assert logged.count("Error Traceback:") == 1
+    assert "Repeated: 3 times since" in logged
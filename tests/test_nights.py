@@ -0,0 +1,57 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import calculate_nights
+
+
+def calculate_nights_by_day(start_datetime, end_datetime):
+    """ The day-by-day loop that calculate_nights replaced, kept as the reference. """
+    count = 0
+    current = start_datetime.replace(hour=12, minute=0, second=0, microsecond=0)
+    if start_datetime < current:
+        current -= timedelta(days=1)
+    while current < end_datetime:
+        count += 1
+        current += timedelta(days=1)
+    return count
+
+
+def random_timezone(rng):
+    offset = timedelta(hours=rng.randint(-12, 14), minutes=rng.choice([0, 30, 45]))
+    return rng.choice([timezone.utc, timezone(offset)])
+
+
+def random_stays(seed, count=2000):
+    """ Naive and fixed-offset (start, end) pairs, including noon boundaries and empty or reversed stays. """
+    rng = random.Random(seed)
+    for _ in range(count):
+        tzinfo = None if rng.random() < 0.5 else random_timezone(rng)
+        start = datetime(2020, 1, 1, tzinfo=tzinfo) + timedelta(
+            seconds=rng.randint(0, 5 * 365 * 86400), microseconds=rng.randint(0, 999999),
+        )
+        if rng.random() < 0.2:
+            start = start.replace(hour=12, minute=0, second=0, microsecond=0)
+        end = start + timedelta(seconds=rng.randint(-86400, 60 * 86400))
+        if rng.random() < 0.2:
+            end = end.replace(hour=12, minute=0, second=0, microsecond=0)
+        if tzinfo is not None and rng.random() < 0.5:
+            end = end.astimezone(random_timezone(rng))  # Same instant, other offset
+        yield start, end
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_calculate_nights_matches_day_by_day_loop(seed):
+    for start, end in random_stays(seed):
+        assert calculate_nights(start, end) == calculate_nights_by_day(start, end), (start, end)
+
+
+@pytest.mark.parametrize("start, end, nights", [
+    (datetime(2030, 1, 1, 13), datetime(2030, 1, 1, 20), 1),
+    (datetime(2030, 1, 1, 22), datetime(2030, 1, 2, 11), 1),
+    (datetime(2030, 1, 1, 12), datetime(2030, 1, 2, 12), 1),
+    (datetime(2030, 1, 1, 11), datetime(2030, 1, 2, 13), 3),
+])
+def test_calculate_nights_examples(start, end, nights):
+    assert calculate_nights(start, end) == nights
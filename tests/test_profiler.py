@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from metrics import to_thread
+from profiler import ProfilingMiddleware, profiler
+
+
+def work_in_worker_thread():
+    time.sleep(0.3)
+
+
+def other_request_hogging_the_loop():
+    deadline = time.perf_counter() + 0.3
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_samples_are_credited_to_the_sampled_request_only():
+    async def sampled_app(scope, receive, send):
+        await to_thread(work_in_worker_thread)
+
+    async def scenario():
+        scope = {"type": "http", "path": "/sampled", "headers": []}
+        sampled = asyncio.create_task(ProfilingMiddleware(sampled_app)(scope, None, None))
+        await asyncio.sleep(0.01)  # Let the sampled request hand its work to a worker thread
+        other_request_hogging_the_loop()
+        await sampled
+
+    profiler.reset()
+    profiler.enable(path="^/sampled$", interval=0.005)
+    try:
+        asyncio.run(scenario())
+    finally:
+        profiler.disable()
+    stacks = profiler.collapsed().splitlines()
+    profiler.reset()
+
+    assert any(stack.startswith("/sampled;[worker thread];") and "work_in_worker_thread" in stack for stack in stacks)
+    assert not any(stack.startswith("/sampled") and "other_request_hogging_the_loop" in stack for stack in stacks)
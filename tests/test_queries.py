@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import event
+
+from main import response_cache
+from models import get_async_engine
+
+
+@pytest.fixture
+def statements(client):
+    """ The SQL statements run by the engine serving heroes and teams during the test. """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    engine = get_async_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def add_teams_with_heroes(client, teams, heroes_per_team=2):
+    response = client.post("/teams/bulk", json=[{"name": "Team", "headquarters": "HQ"} for _ in range(teams)])
+    assert response.status_code == 200
+    heroes = [
+        {"name": "Hero", "secret_name": "Secret", "team_id": team["id"]}
+        for team in response.json() for _ in range(heroes_per_team)
+    ]
+    assert client.post("/heroes/bulk", json=heroes).status_code == 200
+
+
+def count_statements(client, statements, path):
+    response_cache.clear()
+    statements.clear()
+    assert client.get(path).status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("path", ["/teams/", "/heroes/"])
+def test_list_queries_do_not_grow_with_rows(client, statements, path):
+    counts = []
+    for _ in range(3):
+        add_teams_with_heroes(client, 5)
+        counts.append(count_statements(client, statements, path))
+    assert len(set(counts)) == 1, counts
+    assert counts[0] <= 2, counts  # The page, plus the heroes of its teams for /teams/